@@ -1,5 +1,10 @@
 from langchain_openai import ChatOpenAI
 import os
+import json
+import hashlib
+from pydantic import ValidationError
+
+from src.model.generated_email import GeneratedEmail, GeneratedEmailVariants
 from dotenv import load_dotenv
 import logging
 
@@ -14,6 +19,10 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 if not openai_api_key:
     raise ValueError("OPENAI_API_KEY not found in environment variables")
 
+# Client-side timeout per LLM request; bounds how long an abandoned (hedged or
+# timed-out) call can keep holding a thread
+LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "120"))
+
 hb_cta_agent_template = {
     "lead_researcher": {
         "role": "Lead Researcher",
@@ -22,7 +31,7 @@ hb_cta_agent_template = {
         "You extract relevant information about leads from the given data that will help in generating personalised "
         "email for cold out reach.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0),
+        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "company_researcher": {
         "role": "Company Researcher",
@@ -31,7 +40,7 @@ hb_cta_agent_template = {
         "You extract relevant information about a client company from the given data that will help "
         "in generating personalised email for cold out reach.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0),
+        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "hook_body_writer": {
         "role": "Email hook and body Writer",
@@ -42,7 +51,7 @@ hb_cta_agent_template = {
         "1. The Hook: The hook is ideally the first one or two sentences of the email written to get the lead's attention"
         "2. The body: The body describes the product or service offered to the lead.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7),
+        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0.7, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "cta_writer": {
         "role": "Email Call to Action writer",
@@ -51,7 +60,7 @@ hb_cta_agent_template = {
         "You will use the information provided by the Email hook and body Writer and the given call-to-action to write "
         "a call to action for the cold email. Here is the call to action that I want: {cta}",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3),
+        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "email_compiler": {
         "role": "Email compiler",
@@ -60,7 +69,7 @@ hb_cta_agent_template = {
         "Email hook and body Writer and Email Call to Action writer to generate the final email and"
         "validate it to make sure it is professional.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-4", temperature=0.5),
+        "llm": ChatOpenAI(model="gpt-4", temperature=0.5, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     # "email_validator": {
     #     "role": "Email validator",
@@ -138,7 +147,7 @@ email_agents = {
                     "for personalized outreach. You can quickly identify achievements, skills, and potential "
                     "challenges that can be addressed in a cold email.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-4", temperature=0.2),
+        "llm": ChatOpenAI(model="gpt-4", temperature=0.2, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "company_researcher": {
         "role": "Company Intelligence Specialist",
@@ -147,7 +156,7 @@ email_agents = {
                     "You can identify specific ways our solution can bring value to a target company "
                     "based on their size, industry, and growth stage.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-4", temperature=0.2),
+        "llm": ChatOpenAI(model="gpt-4", temperature=0.2, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "email_writer": {
         "role": "Personalized Email Composer",
@@ -156,7 +165,15 @@ email_agents = {
                     "concise, highly personalized emails that demonstrate research and offer clear value without "
                     "using generic language.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-4", temperature=0.7),
+        "llm": ChatOpenAI(model="gpt-4", temperature=0.7, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
+    },
+    "output_repairer": {
+        "role": "Output Formatter",
+        "goal": "Convert email drafts into valid JSON without changing their content",
+        "backstory": "You turn loosely formatted text into strictly valid JSON. You never rewrite, "
+                    "shorten or embellish the content you are given.",
+        "allow_delegation": False,
+        "llm": ChatOpenAI(model="gpt-3.5-turbo", temperature=0, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     },
     "quality_controller": {
         "role": "Email Quality Assurance",
@@ -165,64 +182,107 @@ email_agents = {
                     "errors, appropriately personalized, and effectively communicate value while avoiding "
                     "spam triggers and maintaining a professional tone.",
         "allow_delegation": False,
-        "llm": ChatOpenAI(model="gpt-4", temperature=0.1),
+        "llm": ChatOpenAI(model="gpt-4", temperature=0.1, request_timeout=LLM_REQUEST_TIMEOUT_SECONDS),
     }
 }
 
-# Task templates with clear expected outputs
+# Task templates with clear expected outputs.
+# Each description is split so the static instructions come first, then the
+# campaign-level inputs (offer, cta, seller), and the per-lead data last. Every
+# lead of a campaign then shares a byte-identical prompt prefix, which lets the
+# provider's prompt-prefix caching kick in.
 email_tasks = {
     "profile_analysis_task": {
-        "description": "Analyze this LinkedIn profile: \n\n"
-                      "{linkedin_profile}\n\n"
-                      "Based on this information:\n"
-                      "1. Identify 2-3 specific professional challenges this person likely faces\n"
-                      "2. Note any recent achievements or career milestones that could be mentioned\n"
-                      "3. Determine their likely seniority level and decision-making authority\n"
-                      "4. Given our offer: {offer}, what specific value would most resonate with them?",
+        "instructions": "Analyze the LinkedIn profile given at the end of this message.\n\n"
+                        "Based on this information:\n"
+                        "1. Identify 2-3 specific professional challenges this person likely faces\n"
+                        "2. Note any recent achievements or career milestones that could be mentioned\n"
+                        "3. Determine their likely seniority level and decision-making authority\n"
+                        "4. Given our offer, what specific value would most resonate with them?\n\n",
+        "campaign": "Our offer: {offer}\n\n",
+        "lead": "LinkedIn profile:\n\n"
+                "{linkedin_profile}",
         "expected_output": "A structured analysis with clear bullet points for each category"
     },
     "company_analysis_task": {
-        "description": "Research this company based on available information:\n\n"
-                      "{company_profile}\n\n"
-                      "Based on this company and your knowledge of similar organizations:\n"
-                      "1. What are the top 2-3 challenges this company likely faces that our solution could address?\n"
-                      "2. What stage of growth is this company likely in?\n"
-                      "3. What competitive pressures might they be experiencing?\n"
-                      "4. Given our offer: {offer}, what specific company-wide benefits would they value most?",
+        "instructions": "Research the company described at the end of this message.\n\n"
+                        "Based on this company and your knowledge of similar organizations:\n"
+                        "1. What are the top 2-3 challenges this company likely faces that our solution could address?\n"
+                        "2. What stage of growth is this company likely in?\n"
+                        "3. What competitive pressures might they be experiencing?\n"
+                        "4. Given our offer, what specific company-wide benefits would they value most?\n\n",
+        "campaign": "Our offer: {offer}\n\n",
+        "lead": "Company information:\n\n"
+                "{company_profile}",
         "expected_output": "A structured company analysis with industry-specific insights"
     },
     "email_creation_task": {
-        "description": "Create a personalized cold email using these insights:\n\n"
-                      "Recipient: {lead_name}\n"
-                      "Profile insights: {profile_analysis_result}\n"
-                      "Company insights: {company_analysis_result}\n"
-                      "Our offer: {offer}\n\n"
-                      "Guidelines:\n"
-                      "- Keep the email under 100 words total\n"
-                      "- Start with a highly personalized opening line referencing specific profile details\n"
-                      "- Focus on ONE specific pain point most relevant to them\n"
-                      "- Clearly state the value proposition in business outcome terms\n"
-                      "- End with this call to action: {cta}\n"
-                      "- Sign as: {seller_name}\n\n"
-                      "IMPORTANT: Format your response exactly like this:\n"
-                      "Subject: [Your subject line]\n"
-                      "Email: [Your email body]",
-        "expected_output": "A complete email with subject line and body in the exact format specified"
+        "instructions": "Create a personalized cold email using the insights given at the end of this message.\n\n"
+                        "Guidelines:\n"
+                        "- Keep the email under 100 words total\n"
+                        "- Start with a highly personalized opening line referencing specific profile details\n"
+                        "- Focus on ONE specific pain point most relevant to them\n"
+                        "- Clearly state the value proposition in business outcome terms\n"
+                        "- End with the call to action given below\n"
+                        "- Sign with the sender name given below\n\n"
+                        "IMPORTANT: Respond with only a JSON object, no markdown and no other text, exactly like this:\n"
+                        '{"subject": "<your subject line>", "body": "<your email body>"}\n\n',
+        "campaign": "Our offer: {offer}\n"
+                    "Call to action: {cta}\n"
+                    "Sign as: {seller_name}\n\n",
+        "lead": "Recipient: {lead_name}\n"
+                "Profile insights: {profile_analysis_result}\n"
+                "Company insights: {company_analysis_result}",
+        "expected_output": 'A JSON object {"subject": "...", "body": "..."} with the complete email'
+    },
+    "email_variants_task": {
+        "instructions": "Create several distinct personalized cold email variants for an A/B test, using the insights "
+                        "given at the end of this message.\n\n"
+                        "Guidelines for every variant:\n"
+                        "- Keep the email under 100 words total\n"
+                        "- Start with a highly personalized opening line referencing specific profile details\n"
+                        "- Focus on ONE specific pain point most relevant to them\n"
+                        "- Clearly state the value proposition in business outcome terms\n"
+                        "- End with the call to action given below\n"
+                        "- Sign with the sender name given below\n"
+                        "- Use a clearly different subject line and opening hook in each variant\n\n"
+                        "IMPORTANT: Respond with only a JSON object, no markdown and no other text, exactly like this:\n"
+                        '{"variants": [{"subject": "<subject line>", "body": "<email body>"}, ...]}\n\n',
+        "campaign": "Number of variants: {variant_count}\n"
+                    "Our offer: {offer}\n"
+                    "Call to action: {cta}\n"
+                    "Sign as: {seller_name}\n\n",
+        "lead": "Recipient: {lead_name}\n"
+                "Profile insights: {profile_analysis_result}\n"
+                "Company insights: {company_analysis_result}",
+        "expected_output": 'A JSON object {"variants": [{"subject": "...", "body": "..."}, ...]} with the requested '
+                           'number of complete emails'
     },
     "quality_control_task": {
-        "description": "Review this cold email for quality and effectiveness:\n\n"
-                      "{email_creation_result}\n\n"
-                      "Check for:\n"
-                      "1. Personalization level\n"
-                      "2. Length (under 100 words?)\n"
-                      "3. Value clarity\n"
-                      "4. Call to action clarity\n"
-                      "5. Overall tone\n"
-                      "6. Grammar and spelling\n\n"
-                      "IMPORTANT: Return the final email in exactly this format:\n"
-                      "Subject: [subject]\n"
-                      "Email: [email body]",
-        "expected_output": "The final approved email in the exact format: Subject: [subject] followed by Email: [email body]"
+        "instructions": "Review the cold email given at the end of this message for quality and effectiveness.\n\n"
+                        "Check for:\n"
+                        "1. Personalization level\n"
+                        "2. Length (under 100 words?)\n"
+                        "3. Value clarity\n"
+                        "4. Call to action clarity\n"
+                        "5. Overall tone\n"
+                        "6. Grammar and spelling\n\n"
+                        "IMPORTANT: Return the final email as only a JSON object, no markdown and no other text, exactly like this:\n"
+                        '{"subject": "<subject>", "body": "<email body>"}\n\n',
+        "campaign": "",
+        "lead": "Email to review:\n\n"
+                "{email_creation_result}",
+        "expected_output": 'The final approved email as a JSON object {"subject": "...", "body": "..."}'
+    },
+    "email_repair_task": {
+        "instructions": "The text at the end of this message should contain a cold email, but it is not valid JSON.\n"
+                        "Extract the email's subject line and body without rewriting them and return only a JSON "
+                        "object, no markdown and no other text, exactly like this:\n"
+                        '{"subject": "<subject>", "body": "<email body>"}\n\n',
+        "campaign": "",
+        "lead": "Text:\n\n"
+                "{raw_output}",
+        "expected_output": 'A JSON object {"subject": "...", "body": "..."}'
     }
 }
 
@@ -231,9 +291,83 @@ task_agent_mapping = {
     "profile_analysis_task": "profile_analyzer",
     "company_analysis_task": "company_researcher",
     "email_creation_task": "email_writer",
-    "quality_control_task": "quality_controller"
+    "email_variants_task": "email_writer",
+    "quality_control_task": "quality_controller",
+    "email_repair_task": "output_repairer"
 }
 
+def prompt_config_version(tasks=None, agents=None) -> str:
+    """
+    Hash of the email task and agent configuration (including model and
+    temperature), used to invalidate cached generations when a prompt changes
+    """
+    tasks = email_tasks if tasks is None else tasks
+    agents = email_agents if agents is None else agents
+    payload = {
+        "tasks": tasks,
+        "agents": {
+            name: {
+                **{key: value for key, value in config.items() if key != "llm"},
+                "model": getattr(config.get("llm"), "model_name", None),
+                "temperature": getattr(config.get("llm"), "temperature", None),
+            }
+            for name, config in agents.items()
+        },
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+# Version of the current email prompts
+EMAIL_PROMPT_VERSION = prompt_config_version()
+
+# Structured email parsing
+def parse_email_json(email_text):
+    """
+    Parse a JSON email response of the form {"subject": ..., "body": ...},
+    tolerating surrounding markdown code fences or stray text
+
+    Returns:
+        tuple: (subject, body), or (None, None) if the text is not a valid email object
+    """
+    if not email_text:
+        return None, None
+
+    text = email_text.strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None, None
+
+    try:
+        email = GeneratedEmail.model_validate_json(text[start:end + 1])
+    except (ValidationError, ValueError) as e:
+        logger.warning("Email JSON failed validation: %s", e)
+        return None, None
+
+    return email.subject, email.body
+
+def parse_email_variants_json(email_text):
+    """
+    Parse a multi-variant JSON response of the form {"variants": [{"subject": ..., "body": ...}, ...]}
+
+    Returns:
+        list: [(subject, body), ...], empty if the text is not a valid variants object
+    """
+    if not email_text:
+        return []
+
+    text = email_text.strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return []
+
+    try:
+        response = GeneratedEmailVariants.model_validate_json(text[start:end + 1])
+    except (ValidationError, ValueError) as e:
+        logger.warning("Email variants JSON failed validation: %s", e)
+        return []
+
+    return [(email.subject, email.body) for email in response.variants]
+
 # Email parsing function
 def parse_email(email_text):
     """
@@ -246,7 +380,7 @@ def parse_email(email_text):
         logger.error("Email text is empty")
         return None, None
         
-    logger.info(f"Raw email text to parse: {email_text}")
+    logger.debug("Raw email text to parse: %s", email_text)
     
     lines = email_text.strip().split('\n')
     subject = ""
@@ -263,7 +397,7 @@ def parse_email(email_text):
         if line.lower().startswith("subject:"):
             subject = line[8:].strip()
             subject_found = True
-            logger.info(f"Found subject: {subject}")
+            logger.debug("Found subject: %s", subject)
             
         # Look for email body
         elif line.lower().startswith("email:"):
@@ -283,7 +417,7 @@ def parse_email(email_text):
             if body_lines:
                 body = body + "\n" + "\n".join(body_lines)
             
-            logger.info(f"Found email body: {body}")
+            logger.debug("Found email body: %s", body)
             break
     
     if not subject_found:
@@ -0,0 +1,80 @@
+import json
+import string
+import hashlib
+from functools import lru_cache
+from typing import Dict, Any, FrozenSet
+
+from src.agents.prompt_config import (
+    email_agents,
+    email_tasks,
+    task_agent_mapping,
+    prompt_config_version
+)
+
+# Inputs shared by every lead of a campaign; rendered into the cached prefix
+CAMPAIGN_FIELDS = ("offer", "cta", "seller_name", "variant_count")
+
+
+class CompiledPrompt:
+    """
+    A task template split into a shared prefix (static instructions plus the
+    campaign inputs) and a per-lead suffix. Prefixes are rendered once per
+    campaign and reused, so every lead's prompt starts with identical bytes.
+    """
+
+    def __init__(self, name: str, template: Dict[str, str], agent_name: str, agent_config: Dict[str, Any]):
+        self.name = name
+        self.agent_name = agent_name
+        self.instructions = template["instructions"]
+        self.campaign_template = template.get("campaign", "")
+        self.lead_template = template["lead"]
+        self.expected_output = template["expected_output"]
+        # Changes whenever this task's template or its agent's configuration changes
+        self.version = prompt_config_version({name: template}, {agent_name: agent_config})
+        # Variables the rendered description depends on
+        self.fields: FrozenSet[str] = frozenset(
+            field
+            for text in (self.campaign_template, self.lead_template)
+            for _, field, _, _ in string.Formatter().parse(text)
+            if field
+        )
+        self._prefix = lru_cache(maxsize=256)(self._render_prefix)
+
+    def _render_prefix(self, *values: str) -> str:
+        return self.instructions + self.campaign_template.format(**dict(zip(CAMPAIGN_FIELDS, values)))
+
+    def prefix(self, variables: Dict[str, Any]) -> str:
+        """The shared prefix for the campaign described by `variables`"""
+        return self._prefix(*(str(variables.get(field, "")) for field in CAMPAIGN_FIELDS))
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        """Full task description: shared prefix followed by the lead-specific data"""
+        return self.prefix(variables) + self.lead_template.format(**variables)
+
+    def input_key(self, variables: Dict[str, Any]) -> str:
+        """
+        Hash of this task's version and the variables it renders; a stored
+        output with the same key was produced from identical inputs
+        """
+        inputs = {field: str(variables.get(field, "")) for field in sorted(self.fields)}
+        payload = json.dumps([self.version, inputs], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PromptRegistry:
+    """Email task templates compiled once at import, each with its own version"""
+
+    def __init__(self, tasks=None, agents=None, mapping=None):
+        tasks = email_tasks if tasks is None else tasks
+        agents = email_agents if agents is None else agents
+        mapping = task_agent_mapping if mapping is None else mapping
+        self.prompts: Dict[str, CompiledPrompt] = {
+            name: CompiledPrompt(name, template, mapping[name], agents[mapping[name]])
+            for name, template in tasks.items()
+        }
+
+    def __getitem__(self, name: str) -> CompiledPrompt:
+        return self.prompts[name]
+
+
+prompt_registry = PromptRegistry()
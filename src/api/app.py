@@ -0,0 +1,278 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from src.db.session import SessionLocal, engine, get_db
+from src.db.schema import create_schema
+from src.logging_config import configure_logging
+from src.model.lead_email_details import LeadEmailDetails
+from src.model.lead_email_variant import LeadEmailVariant
+from src.service.email_generation_service import EmailGenerationService
+from src.service.lead_ingestion_service import LeadIngestionService
+from src.service.lead_export_service import EXPORT_FORMATS, LeadExportService
+from src.service.generation_coordinator import GenerationCoordinator, QueueFullError
+from src.service.lead_scheduler import claim_heartbeat
+from src.service.llm_resilience import CircuitOpenError
+from src.service.lead_processing_service import (
+    DEFAULT_OFFER,
+    DEFAULT_CTA,
+    DEFAULT_SELLER_NAME,
+    LeadBusyError,
+    LeadNotFoundError,
+    apply_regeneration_inputs,
+    claim_lead,
+    process_lead,
+    requeue_leads
+)
+from src.service.metrics_service import MetricsService
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_GENERATIONS = int(os.getenv("API_MAX_CONCURRENT_GENERATIONS", "4"))
+MAX_QUEUE_DEPTH = int(os.getenv("API_MAX_QUEUE_DEPTH", "20"))
+GENERATION_TIMEOUT_SECONDS = float(os.getenv("API_GENERATION_TIMEOUT_SECONDS", "300"))
+
+email_service: Optional[EmailGenerationService] = None
+coordinator: Optional[GenerationCoordinator] = None
+ingestion_service: Optional[LeadIngestionService] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global email_service, coordinator, ingestion_service
+    # Create tables if they don't exist
+    create_schema(engine)
+    email_service = EmailGenerationService()
+    ingestion_service = LeadIngestionService(linkedin_service=email_service.linkedin_service)
+    coordinator = GenerationCoordinator(
+        max_workers=MAX_CONCURRENT_GENERATIONS,
+        max_queue_depth=MAX_QUEUE_DEPTH
+    )
+    yield
+    coordinator.shutdown(wait=False)
+
+
+app = FastAPI(title="Zylo email generator", lifespan=lifespan)
+
+
+class GenerateEmailRequest(BaseModel):
+    """Ad-hoc generation for a profile that is not stored as a lead"""
+    snapshot_id: str
+    lead_name: str
+    linkedin_url: Optional[str] = None
+    offer: Optional[str] = None
+    cta: Optional[str] = None
+    seller_name: Optional[str] = None
+    variant_count: int = 1
+
+
+class LeadIngestRow(BaseModel):
+    lead_name: Optional[str] = None
+    linkedin_url: Optional[str] = None
+    company_name: Optional[str] = None
+    product_desc: Optional[str] = None
+    cta: Optional[str] = None
+    email_salutation: Optional[str] = None
+    snapshot_id: str
+    priority: int = 0
+    tenant_key: Optional[str] = None
+    seller_name: Optional[str] = None
+    variant_count: int = 1
+
+
+class RegenerateRequest(BaseModel):
+    """Changed generation inputs; omitted fields keep their stored values"""
+    offer: Optional[str] = None
+    cta: Optional[str] = None
+    seller_name: Optional[str] = None
+
+
+class RequeueSnapshotRequest(RegenerateRequest):
+    snapshot_id: str
+
+
+class BulkLeadRequest(BaseModel):
+    leads: List[LeadIngestRow]
+    dry_run: bool = False
+
+
+def _lead_response(db: Session, lead: LeadEmailDetails) -> Dict[str, Any]:
+    variants = (
+        db.query(LeadEmailVariant.subject, LeadEmailVariant.body)
+        .filter(LeadEmailVariant.lead_id == lead.id)
+        .order_by(LeadEmailVariant.variant_index)
+        .all()
+    )
+    return {
+        "lead_id": lead.id,
+        "status": lead.status,
+        "greeting": lead.generated_email_greeting,
+        "subject": lead.generated_email_hook,
+        "body": lead.generated_email_body,
+        "variants": [{"subject": subject, "body": body} for subject, body in variants],
+    }
+
+
+def _generate_for_lead(lead_id: int, force: bool, changes: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    Claim and process a stored lead on a worker thread with its own session,
+    after applying any changed inputs
+    """
+    db = SessionLocal()
+    try:
+        lead = db.get(LeadEmailDetails, lead_id)
+        if lead is None:
+            raise LeadNotFoundError(f"Lead {lead_id} not found")
+        if lead.status == "done" and not force:
+            return _lead_response(db, lead)
+
+        statuses = ("not_started", "error", "done") if force else ("not_started", "error")
+        if not claim_lead(db, lead_id, statuses):
+            raise LeadBusyError(f"Lead {lead_id} is already being processed")
+        if changes and apply_regeneration_inputs(lead, changes):
+            db.commit()
+
+        # A generation can outlast the lease; keep the claim alive like a job run does
+        with claim_heartbeat(SessionLocal, [lead_id]):
+            result = process_lead(db, lead, email_service, refresh=force)
+        response = _lead_response(db, lead)
+        if result.get("status") == "error":
+            response["message"] = result.get("message")
+        return response
+    finally:
+        db.close()
+
+
+def _generate_for_profile(request: GenerateEmailRequest) -> Dict[str, Any]:
+    """Generate an email for an ad-hoc profile without storing a lead"""
+    result = email_service.generate_email(
+        snapshot_id=request.snapshot_id,
+        lead_name=request.lead_name,
+        linkedin_url=request.linkedin_url,
+        offer=request.offer or DEFAULT_OFFER,
+        cta=request.cta or DEFAULT_CTA,
+        seller_name=request.seller_name or DEFAULT_SELLER_NAME,
+        variant_count=request.variant_count
+    )
+    db = SessionLocal()
+    try:
+        MetricsService.persist(db, None, result["metrics"])
+    finally:
+        db.close()
+    return {key: value for key, value in result.items() if key in ("status", "message", "subject", "body", "variants")}
+
+
+async def _await_generation(key: str, fn, *args) -> Dict[str, Any]:
+    """Submit (or join) a generation and wait for it without blocking the event loop"""
+    try:
+        future = coordinator.submit(key, fn, *args)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    try:
+        # Shielded so a timed-out waiter doesn't cancel the generation for others
+        return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), GENERATION_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Generation is still running, retry later")
+    except LeadNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except LeadBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(max(1, int(e.retry_after)))})
+
+
+@app.post("/leads/bulk")
+def ingest_leads(request: BulkLeadRequest):
+    """
+    Validate leads against their snapshots and insert the good ones in bulk;
+    rejected rows come back with a reason and are not inserted
+    """
+    return ingestion_service.ingest([lead.dict() for lead in request.leads], dry_run=request.dry_run)
+
+
+@app.post("/leads/{lead_id}/generate")
+async def generate_lead_email(lead_id: int, force: bool = False):
+    """Generate (or return the already generated) email for a stored lead"""
+    return await _await_generation(f"lead:{lead_id}", _generate_for_lead, lead_id, force)
+
+
+@app.post("/leads/{lead_id}/regenerate")
+async def regenerate_lead_email(lead_id: int, request: RegenerateRequest):
+    """
+    Regenerate a lead's email with changed inputs; analysis stages whose
+    inputs are unchanged reuse the outputs stored on the lead
+    """
+    changes = request.dict()
+    fingerprint = hashlib.sha256(json.dumps(changes, sort_keys=True).encode("utf-8")).hexdigest()
+    return await _await_generation(f"lead:{lead_id}:regenerate:{fingerprint}", _generate_for_lead,
+                                   lead_id, True, changes)
+
+
+@app.post("/leads/regenerate")
+def requeue_snapshot_leads(request: RequeueSnapshotRequest, db: Session = Depends(get_db)):
+    """Apply changed inputs to a snapshot's finished leads and queue them for incremental regeneration"""
+    changes = request.dict()
+    requeued = requeue_leads(db, changes.pop("snapshot_id"), changes)
+    return {"requeued": requeued}
+
+
+@app.post("/emails/generate")
+async def generate_email(request: GenerateEmailRequest):
+    """Generate an email for a profile and offer without creating a lead"""
+    fingerprint = hashlib.sha256(
+        json.dumps(request.dict(), sort_keys=True).encode("utf-8")
+    ).hexdigest()
+    result = await _await_generation(f"profile:{fingerprint}", _generate_for_profile, request)
+    if result.get("status") == "error":
+        raise HTTPException(status_code=502, detail=result.get("message"))
+    return result
+
+
+@app.get("/emails/export")
+def export_emails(format: str = "csv",
+                  snapshot_id: Optional[str] = None,
+                  since: Optional[datetime] = None,
+                  until: Optional[datetime] = None,
+                  after_id: Optional[int] = None):
+    """
+    Stream generated emails in id order as CSV or NDJSON; resume an
+    interrupted export by passing the last id received as `after_id`
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    chunks = LeadExportService().export(
+        format,
+        snapshot_id=snapshot_id,
+        since=since,
+        until=until,
+        after_id=after_id
+    )
+    return StreamingResponse(chunks, media_type=EXPORT_FORMATS[format])
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics(db: Session = Depends(get_db)):
+    """Prometheus-style dump of stage metrics and process counters"""
+    return MetricsService.render_prometheus(db)
+
+
+@app.get("/health")
+def health():
+    return {
+        "status": "ok",
+        "in_flight": coordinator.in_flight if coordinator else 0,
+    }
@@ -0,0 +1,185 @@
+import io
+import json
+import re
+import random
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+from src.service.metrics_service import record_usage
+
+
+class LatencyDistribution:
+    """
+    Configurable latency distribution, parsed from a spec string:
+
+        fixed:<seconds>
+        uniform:<low>,<high>
+        normal:<mean>,<stddev>
+        lognormal:<median>,<sigma>
+    """
+
+    def __init__(self, spec: str = "fixed:0", seed: Optional[int] = None):
+        self.spec = spec
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip().lower()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        self._random = random.Random(seed)
+
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.params) != expected[self.kind]:
+            raise ValueError(f"Invalid latency spec: {spec}")
+
+    def sample(self) -> float:
+        """Draw one latency value in seconds (never negative)"""
+        if self.kind == "fixed":
+            value = self.params[0]
+        elif self.kind == "uniform":
+            value = self._random.uniform(*self.params)
+        elif self.kind == "normal":
+            value = self._random.gauss(*self.params)
+        else:
+            median, sigma = self.params
+            value = median * self._random.lognormvariate(0, sigma)
+        return max(0.0, value)
+
+
+class StageTimings:
+    """Thread-safe collector of per-stage durations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = defaultdict(list)
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.durations[stage].append(seconds)
+
+
+def make_profile(index: int, about_words: int = 80, skills: int = 10) -> Dict[str, Any]:
+    """Build a synthetic LinkedIn profile in the S3 snapshot format"""
+    rng = random.Random(index)
+    words = ["growth", "platform", "teams", "delivery", "customers", "strategy", "data",
+             "operations", "scaling", "leadership", "product", "revenue", "cloud", "hiring"]
+    return {
+        "id": f"bench-{index}",
+        "name": f"Bench Lead {index}",
+        "headline": f"Head of {rng.choice(words).title()} at Company {index % 97}",
+        "location": "Berlin, Germany",
+        "about": " ".join(rng.choice(words) for _ in range(about_words)),
+        "url": f"https://www.linkedin.com/in/bench-lead-{index}",
+        "current_company": {
+            "name": f"Company {index % 97}",
+            "description": " ".join(rng.choice(words) for _ in range(about_words // 2)),
+        },
+        "experience": [
+            {
+                "title": f"Role {j}",
+                "company_name": f"Company {(index + j) % 97}",
+                "duration": f"{j + 1} years",
+                "description": " ".join(rng.choice(words) for _ in range(20)),
+            }
+            for j in range(3)
+        ],
+        "education": [{"school_name": "Bench University", "degree": "MSc", "start_year": "2010", "end_year": "2012"}],
+        "skills": [{"name": f"Skill {rng.randint(0, 500)}"} for _ in range(skills)],
+        "languages": [{"title": "English", "subtitle": "Native"}],
+    }
+
+
+class FakeS3Client:
+    """
+    Minimal stand-in for the boto3 S3 client serving synthetic snapshots.
+
+    Snapshots are stored pre-serialized so each `get_object` call pays the
+    same decode/parse cost as a real S3 read.
+    """
+
+    def __init__(self,
+                 latency: Optional[LatencyDistribution] = None,
+                 timings: Optional[StageTimings] = None):
+        self.latency = latency or LatencyDistribution("fixed:0")
+        self.timings = timings
+        self.objects: Dict[str, bytes] = {}
+
+    def add_snapshot(self, snapshot_id: str, profiles: List[Dict[str, Any]]) -> List[str]:
+        """Store a snapshot and return the profile URLs it contains"""
+        self.objects[f"public/{snapshot_id}.json"] = json.dumps(profiles).encode("utf-8")
+        return [profile["url"] for profile in profiles]
+
+    def get_object(self, Bucket: str, Key: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        time.sleep(self.latency.sample())
+        if Key not in self.objects:
+            raise KeyError(f"NoSuchKey: {Key}")
+        body = io.BytesIO(self.objects[Key])
+        if self.timings:
+            self.timings.record("s3_fetch", time.perf_counter() - start)
+        return {"Body": body}
+
+
+class FakeLLM:
+    """
+    Fake stage runner for `EmailGenerationService` with per-stage latency.
+
+    Returns canned outputs shaped like the real crew outputs so downstream
+    parsing runs exactly as in production.
+    """
+
+    def __init__(self,
+                 latency: Optional[LatencyDistribution] = None,
+                 stage_latency: Optional[Dict[str, LatencyDistribution]] = None,
+                 timings: Optional[StageTimings] = None,
+                 model: str = "gpt-4",
+                 malformed_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.latency = latency or LatencyDistribution("fixed:0")
+        self.stage_latency = stage_latency or {}
+        self.timings = timings
+        self.model = model
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+
+    def __call__(self, stage_name: str, description: str, expected_output: str) -> str:
+        start = time.perf_counter()
+        time.sleep(self.stage_latency.get(stage_name, self.latency).sample())
+        # Echo the campaign's CTA and signature like a real writer, so the
+        # local QC gate passes and the skip path is exercised
+        cta = self._campaign_line("Call to action", description) or "Would a 15-minute call next week work?"
+        seller_name = self._campaign_line("Sign as", description) or "John Doe"
+        if stage_name in ("email_creation_task", "quality_control_task", "email_repair_task"):
+            subject = "Helping your team ship faster"
+            body = (
+                "Hi there,\n"
+                "I noticed your recent work on scaling delivery and thought our workshops could help.\n"
+                f"{cta}\n"
+                f"Best,\n{seller_name}"
+            )
+            if stage_name != "email_repair_task" and self._random.random() < self.malformed_rate:
+                # Formatting drift the strict parsers can't handle
+                output = f"**Subject line:** {subject}\n\n**Body:**\n{body}"
+            else:
+                output = json.dumps({"subject": subject, "body": body})
+        elif stage_name == "email_variants_task":
+            match = re.search(r"Number of variants: (\d+)", description)
+            count = int(match.group(1)) if match else 2
+            output = json.dumps({"variants": [
+                {
+                    "subject": f"Variant {i + 1}: helping your team ship faster",
+                    "body": f"Hi there,\nOur workshops could help your team.\n{cta}\nBest,\n{seller_name}",
+                }
+                for i in range(count)
+            ]})
+        else:
+            output = "- Insight one\n- Insight two\n- Insight three"
+        # Rough token estimate so cost accounting is exercised
+        record_usage(stage_name, self.model, int(len(description.split()) * 1.3), int(len(output.split()) * 1.3))
+        if self.timings:
+            self.timings.record(f"llm:{stage_name}", time.perf_counter() - start)
+        return output
+
+    @staticmethod
+    def _campaign_line(label: str, description: str) -> Optional[str]:
+        match = re.search(rf"^{re.escape(label)}: (.+)$", description, re.MULTILINE)
+        return match.group(1).strip() if match else None
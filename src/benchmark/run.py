@@ -0,0 +1,302 @@
+"""
+Offline throughput benchmark for the email generation pipeline.
+
+Drives `run_email_generation_job` (or `EmailGenerationService` directly)
+against a local database, a fake S3 serving synthetic snapshots and a fake
+LLM with configurable latency. Nothing touches OpenAI or AWS.
+
+Usage:
+    python -m src.benchmark.run --leads 200 --llm-latency lognormal:0.05,0.5
+    python -m src.benchmark.run --mode service --output bench_results.jsonl
+    python -m src.benchmark.run --log-mode sync --log-format text   # pre-queue logging baseline
+    python -m src.benchmark.run --leads 10000 --rss-sample-every 500   # long-run memory check
+
+With --rss-sample-every, `rss_growth_kb` is the RSS change between the first
+sample (after warm-up) and the last; it should stay near zero however many
+leads the run processes.
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Any, List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile, 0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """Summarize a list of durations (seconds) in milliseconds"""
+    return {
+        "count": len(values),
+        "total_s": round(sum(values), 6),
+        "mean_ms": round(1000 * sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(1000 * percentile(values, 50), 3),
+        "p95_ms": round(1000 * percentile(values, 95), 3),
+        "max_ms": round(1000 * max(values), 3) if values else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline email generation benchmark")
+    parser.add_argument("--mode", choices=["job", "service"], default="job",
+                        help="Drive the cron job runner or call EmailGenerationService directly")
+    parser.add_argument("--leads", type=int, default=100, help="Number of leads to generate")
+    parser.add_argument("--snapshots", type=int, default=5, help="Number of snapshots to spread leads over")
+    parser.add_argument("--profiles-per-snapshot", type=int, default=50,
+                        help="Profiles per synthetic snapshot (controls snapshot size)")
+    parser.add_argument("--about-words", type=int, default=80, help="Words in each profile's about section")
+    parser.add_argument("--s3-latency", default="fixed:0", help="Fake S3 latency spec, e.g. uniform:0.01,0.05")
+    parser.add_argument("--llm-latency", default="fixed:0", help="Fake LLM latency spec for every stage")
+    parser.add_argument("--stage-latency", action="append", default=[], metavar="STAGE=SPEC",
+                        help="Per-stage override, e.g. quality_control_task=lognormal:0.5,0.3")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of final-stage LLM outputs returned in a malformed format")
+    parser.add_argument("--database-url", default=None,
+                        help="Database URL (defaults to a temporary SQLite file)")
+    parser.add_argument("--result-cache", action="store_true",
+                        help="Enable the whole-email result cache (off by default so every lead runs the pipeline)")
+    parser.add_argument("--profile-reuse", action=argparse.BooleanOptionalAction, default=True,
+                        help="Near-duplicate profile analysis reuse (on in production, so on by default)")
+    parser.add_argument("--variants", type=int, default=1, help="A/B email variants generated per lead")
+    parser.add_argument("--prefetch-depth", type=int, default=2,
+                        help="Leads the job pipeline's fetch stage may run ahead of generation")
+    parser.add_argument("--rss-sample-every", type=int, default=0, metavar="N",
+                        help="Sample resident memory every N generated leads (0 = off)")
+    parser.add_argument("--log-mode", choices=["queue", "sync"], default="queue",
+                        help="Log through the background queue, or write synchronously from the caller")
+    parser.add_argument("--log-format", choices=["json", "text"], default="json")
+    parser.add_argument("--log-level", default="INFO")
+    parser.add_argument("--log-file", default=None, help="Where application logs go (default: a temp file)")
+    parser.add_argument("--verbose-sample-rate", type=float, default=0.0,
+                        help="Fraction of leads run with verbose crew output")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Append machine-readable results (JSON line) to this file")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args) -> str:
+    """
+    Point the app at local stand-ins. Must run before any `src` module that
+    reads configuration at import time is imported.
+    """
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='zylo-bench-')}/bench.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-not-used")
+    os.environ.setdefault("S3_BUCKET", "benchmark-bucket")
+    os.environ.setdefault("AWS_ACCESS_KEY", "benchmark")
+    os.environ.setdefault("AWS_SECRET_KEY", "benchmark")
+    os.environ["LOG_VERBOSE_SAMPLE_RATE"] = str(args.verbose_sample_rate)
+    os.environ["LEAD_PIPELINE_PREFETCH"] = str(args.prefetch_depth)
+    return database_url
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    database_url = configure_environment(args)
+
+    # Logging must be configured before the app modules do it themselves
+    from src.logging_config import configure_logging, dropped_log_records, stop_logging
+    log_path = args.log_file or os.path.join(tempfile.mkdtemp(prefix="zylo-bench-logs-"), "app.log")
+    log_stream = open(log_path, "w")
+    configure_logging(stream=log_stream, level=args.log_level.upper(), fmt=args.log_format,
+                      use_queue=args.log_mode == "queue")
+
+    from src.benchmark.fakes import FakeLLM, FakeS3Client, LatencyDistribution, StageTimings, make_profile
+    from src.db.session import SessionLocal, engine
+    from src.db.schema import create_schema
+    from src.model.lead_email_details import LeadEmailDetails
+    from src.model.lead_generation_metric import LeadGenerationMetric
+    from src.service.email_cache_service import EmailCacheService
+    from src.service.email_generation_service import EmailGenerationService
+    from src.service.profile_similarity_service import ProfileSimilarityService
+    from src.service.metrics_service import counters, current_rss_kb, peak_rss_kb
+    from src.service.linkedin_client_service import LinkedInClientService
+
+    timings = StageTimings()
+    lead_latencies: List[float] = []
+    lead_costs: List[float] = []
+    # [leads generated, RSS KB] pairs
+    rss_series: List[List[int]] = []
+
+    class TimedEmailGenerationService(EmailGenerationService):
+        def generate_email(self, *a, **kw):
+            start = time.perf_counter()
+            result = super().generate_email(*a, **kw)
+            lead_latencies.append(time.perf_counter() - start)
+            # Per-stage breakdown comes from the pipeline's own instrumentation
+            for record in result["metrics"].stages:
+                timings.record(record["stage"], record["duration_ms"] / 1000.0)
+            lead_costs.append(result["metrics"].total_cost_usd)
+            if args.rss_sample_every and len(lead_latencies) % args.rss_sample_every == 0:
+                rss_series.append([len(lead_latencies), current_rss_kb()])
+            return result
+
+    # Build fakes and synthetic snapshots
+    stage_latency = {}
+    for override in args.stage_latency:
+        stage, _, spec = override.partition("=")
+        stage_latency[stage] = LatencyDistribution(spec, seed=args.seed)
+    s3 = FakeS3Client(LatencyDistribution(args.s3_latency, seed=args.seed))
+    llm = FakeLLM(LatencyDistribution(args.llm_latency, seed=args.seed), stage_latency,
+                  malformed_rate=args.malformed_rate, seed=args.seed)
+
+    snapshot_urls: Dict[str, List[str]] = {}
+    for s in range(args.snapshots):
+        snapshot_id = f"bench-snapshot-{s}"
+        profiles = [
+            make_profile(s * args.profiles_per_snapshot + p, about_words=args.about_words)
+            for p in range(args.profiles_per_snapshot)
+        ]
+        snapshot_urls[snapshot_id] = s3.add_snapshot(snapshot_id, profiles)
+
+    email_service = TimedEmailGenerationService(
+        linkedin_service=LinkedInClientService(s3_client=s3),
+        stage_runner=llm,
+        result_cache=EmailCacheService(enabled=args.result_cache),
+        profile_index=ProfileSimilarityService(enabled=args.profile_reuse),
+    )
+
+    # Seed leads, old enough to pass the settle delay
+    create_schema(engine)
+    db = SessionLocal()
+    seeded_at = datetime.utcnow() - timedelta(hours=1)
+    leads = []
+    snapshot_ids = sorted(snapshot_urls)
+    for i in range(args.leads):
+        snapshot_id = snapshot_ids[i % len(snapshot_ids)]
+        urls = snapshot_urls[snapshot_id]
+        leads.append(LeadEmailDetails(
+            lead_name=f"Bench Lead {i}",
+            linkedin_url=urls[(i // len(snapshot_ids)) % len(urls)],
+            snapshot_id=snapshot_id,
+            status="not_started",
+            variant_count=args.variants,
+            updated_at=seeded_at,
+        ))
+    db.add_all(leads)
+    db.commit()
+    lead_rows = [(lead.snapshot_id, lead.lead_name, lead.linkedin_url) for lead in leads]
+    db.close()
+    # Don't let the seeded ORM objects count against the run's memory
+    del leads
+
+    # Run
+    cpu_start = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    if args.mode == "job":
+        from src.cron.cron import run_email_generation_job
+        run_email_generation_job(email_service=email_service)
+    else:
+        for snapshot_id, lead_name, linkedin_url in lead_rows:
+            email_service.generate_email(
+                snapshot_id=snapshot_id,
+                lead_name=lead_name,
+                linkedin_url=linkedin_url,
+                offer="Benchmark offer",
+                cta="Benchmark call to action",
+                seller_name="John Doe",
+                variant_count=args.variants,
+            )
+    elapsed = time.perf_counter() - start
+    cpu_end = resource.getrusage(resource.RUSAGE_SELF)
+    cpu_s = (cpu_end.ru_utime - cpu_start.ru_utime) + (cpu_end.ru_stime - cpu_start.ru_stime)
+
+    # Drain queued records so the log size covers the whole run
+    log_dropped = dropped_log_records()
+    stop_logging()
+    log_stream.flush()
+    log_stream.close()
+    with open(log_path, "rb") as f:
+        log_lines = sum(1 for _ in f)
+    log_bytes = os.path.getsize(log_path)
+
+    db = SessionLocal()
+    status_counts = Counter(status for (status,) in db.query(LeadEmailDetails.status).all())
+    # Write-back happens in the job runner, outside generate_email
+    for (duration_ms,) in db.query(LeadGenerationMetric.duration_ms).filter(LeadGenerationMetric.stage == "write_back"):
+        timings.record("write_back", duration_ms / 1000.0)
+    db.close()
+
+    stages = {name: summarize(values) for name, values in sorted(timings.durations.items())}
+    return {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_revision": git_revision(),
+        "config": {
+            "mode": args.mode,
+            "leads": args.leads,
+            "snapshots": args.snapshots,
+            "profiles_per_snapshot": args.profiles_per_snapshot,
+            "about_words": args.about_words,
+            "s3_latency": args.s3_latency,
+            "llm_latency": args.llm_latency,
+            "stage_latency": args.stage_latency,
+            "result_cache": args.result_cache,
+            "profile_reuse": args.profile_reuse,
+            "malformed_rate": args.malformed_rate,
+            "prefetch_depth": args.prefetch_depth,
+            "variants": args.variants,
+            "database": database_url.split(":", 1)[0],
+            "log_mode": args.log_mode,
+            "log_format": args.log_format,
+            "log_level": args.log_level.upper(),
+            "verbose_sample_rate": args.verbose_sample_rate,
+            "rss_sample_every": args.rss_sample_every,
+        },
+        "elapsed_s": round(elapsed, 6),
+        "cpu_s": round(cpu_s, 6),
+        "leads_per_sec": round(len(lead_latencies) / elapsed, 3) if elapsed else 0.0,
+        "lead_latency": summarize(lead_latencies),
+        "stages": stages,
+        "db_and_overhead_s": round(max(0.0, elapsed - sum(lead_latencies)), 6),
+        "estimated_cost_usd": round(sum(lead_costs), 6),
+        "profile_reuse_rate": round(email_service.profile_index.reuse_rate, 4),
+        "qc_skip_rate": round(email_service.quality_gate.skip_rate, 4),
+        "email_parse_outcomes": {
+            outcome: counters.get("zylo_email_parse_total", outcome=outcome)
+            for outcome in ("json", "legacy", "repaired", "variants", "failed")
+        },
+        "status_counts": dict(status_counts),
+        "log_bytes": log_bytes,
+        "log_dropped": log_dropped,
+        "log_lines": log_lines,
+        "peak_rss_kb": peak_rss_kb(),
+        "rss_series_kb": rss_series,
+        "rss_growth_kb": rss_series[-1][1] - rss_series[0][1] if len(rss_series) > 1 and rss_series[0][1] is not None else 0,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run_benchmark(args)
+    line = json.dumps(results, sort_keys=True)
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(line + "\n")
+    sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + "\n")
+
+
+if __name__ == "__main__":
+    main()
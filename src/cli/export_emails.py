@@ -0,0 +1,55 @@
+"""
+Stream generated emails ("done" leads) to a CSV or NDJSON file.
+
+Rows come out in id order; pass the last exported id as --after-id to resume
+an interrupted export.
+
+Usage:
+    python -m src.cli.export_emails --snapshot-id s_abc123 --output campaign.csv
+    python -m src.cli.export_emails --format ndjson --since 2024-05-01 --after-id 41230
+"""
+
+import argparse
+import sys
+from datetime import datetime
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export generated emails")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    parser.add_argument("--snapshot-id", default=None, help="Only leads from this snapshot")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Only emails generated at or after this ISO date/time")
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None,
+                        help="Only emails generated before this ISO date/time")
+    parser.add_argument("--after-id", type=int, default=None, help="Resume after this lead id")
+    parser.add_argument("--output", default=None, help="Output file (default: stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    from src.logging_config import configure_logging
+    from src.service.lead_export_service import LeadExportService
+
+    configure_logging(stream=sys.stderr)
+    chunks = LeadExportService().export(
+        args.format,
+        snapshot_id=args.snapshot_id,
+        since=args.since,
+        until=args.until,
+        after_id=args.after_id
+    )
+
+    out = open(args.output, "w", newline="", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Bulk-load leads from a CSV or JSON-lines file.
+
+Rows are validated against their snapshots before anything is inserted;
+rejected rows are reported (and optionally written out) with the reason.
+Exits non-zero if any row was rejected.
+
+Usage:
+    python -m src.cli.ingest_leads leads.csv
+    python -m src.cli.ingest_leads leads.jsonl --rejects rejects.jsonl --dry-run
+"""
+
+import argparse
+import csv
+import json
+import sys
+from typing import Any, Dict, Iterator
+
+
+def read_rows(path: str, fmt: str) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load leads into lead_email_details")
+    parser.add_argument("path", help="CSV (with a header row) or JSON-lines file of leads")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None,
+                        help="Input format, defaults to the file extension")
+    parser.add_argument("--rejects", default=None, help="Write rejected rows with reasons to this JSON-lines file")
+    parser.add_argument("--dry-run", action="store_true", help="Validate only, insert nothing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "jsonl")
+
+    from src.db.session import engine
+    from src.db.schema import create_schema
+    from src.logging_config import configure_logging
+    from src.service.lead_ingestion_service import LeadIngestionService
+
+    configure_logging(stream=sys.stderr)
+    create_schema(engine)
+    result = LeadIngestionService().ingest(read_rows(args.path, fmt), dry_run=args.dry_run)
+
+    if args.rejects:
+        with open(args.rejects, "w", encoding="utf-8") as f:
+            for rejection in result["rejected"]:
+                f.write(json.dumps(rejection) + "\n")
+
+    sys.stdout.write(json.dumps({
+        "accepted": result["accepted"],
+        "inserted": result["inserted"],
+        "rejected": len(result["rejected"]),
+        "dry_run": args.dry_run,
+    }, indent=2) + "\n")
+    return 1 if result["rejected"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,17 @@
+import os
+import threading
 import warnings
 import traceback
 import logging
-from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from typing import Optional
 
-from src.db.session import SessionLocal, engine
-from src.model.lead_email_details import LeadEmailDetails, Base
+from src.db.session import engine
+from src.db.schema import create_schema
+from src.logging_config import configure_logging
 from src.service.email_generation_service import EmailGenerationService
+from src.service.lead_pipeline import LeadPipeline
+from src.service.llm_resilience import CircuitOpenError
+from src.service.metrics_service import counters
 
 # Suppress specific Pydantic warning about V1/V2 mixing
 warnings.filterwarnings(
@@ -18,107 +22,96 @@ warnings.filterwarnings(
 )
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
-# Default offer and CTA text
-DEFAULT_OFFER = "We provide top-tier corporate training services designed to enhance team productivity and skill development through customized workshops and ongoing support."
-DEFAULT_CTA = "Reply to this email or schedule a 15-minute call to learn how we can tailor our training to your team's specific needs."
-DEFAULT_SELLER_NAME = "John Doe"
+# Leads are only picked up once they have been untouched for this long, so the
+# inserting client can finish writing the row. Shared by the listener worker
+# and the fallback cron run.
+LEAD_SETTLE_DELAY_SECONDS = float(os.getenv("LEAD_SETTLE_DELAY_SECONDS", "5"))
+
+# Outcomes counted by `record_parse_outcome`, logged per run next to the QC skip rate
+EMAIL_PARSE_OUTCOMES = ("json", "legacy", "repaired", "variants", "failed")
+
+
+def parse_outcome_counts():
+    """Final email parse outcomes counted so far in this process"""
+    return {outcome: counters.get("zylo_email_parse_total", outcome=outcome) for outcome in EMAIL_PARSE_OUTCOMES}
 
-def run_email_generation_job():
+def run_email_generation_job(email_service: Optional[EmailGenerationService] = None,
+                             settle_delay_seconds: Optional[float] = None,
+                             stop_event: Optional[threading.Event] = None):
     """
-    Cron job to generate emails for leads that are not started and older than 2 minutes
+    Cron job to generate emails for leads that are not started and have settled
+
+    Args:
+        email_service: Optional pre-configured service (e.g. with fake S3/LLM for benchmarks)
+        settle_delay_seconds: Minimum age of a lead's last update, defaults to LEAD_SETTLE_DELAY_SECONDS
+        stop_event: When set, finish the current lead, release the rest of the batch and return
+
+    Returns:
+        int: Number of leads processed
     """
+    if settle_delay_seconds is None:
+        settle_delay_seconds = LEAD_SETTLE_DELAY_SECONDS
+
     # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    create_schema(engine)
     
     # Initialize services
-    email_service = EmailGenerationService()
+    email_service = email_service or EmailGenerationService()
+    email_service.result_cache.purge_expired()
     
-    # Create database session
-    db: Session = SessionLocal()
+    processed = 0
+    parse_outcomes_before = parse_outcome_counts()
 
     try:
         logger.info("Starting email generation job")
         
-        # Get leads with status "not_started" and updated more than 2 minutes ago
-        two_mins_ago = datetime.utcnow() - timedelta(minutes=2)
-        leads = (
-            db.query(LeadEmailDetails)
-            .filter(
-                and_(
-                    LeadEmailDetails.status == "not_started",
-                    LeadEmailDetails.updated_at <= two_mins_ago
-                )
-            )
-            .all()
-        )
+        # Small claim batches keep priorities and fair share re-evaluated as
+        # new leads arrive during a long run
+        while True:
+            pipeline = LeadPipeline(email_service, settle_delay_seconds, stop_event=stop_event)
+            try:
+                processed += pipeline.run()
+                break
+            except CircuitOpenError as e:
+                # The provider is failing: unstarted leads went back to the
+                # queue; pause instead of burning through them as errors
+                processed += pipeline.processed
+                logger.warning("%s; pausing %.0fs", e, e.retry_after)
+                if (stop_event or threading.Event()).wait(e.retry_after):
+                    break
         
-        if not leads:
+        if not processed:
             logger.info("No eligible leads found.")
-            return
-
-        logger.info(f"Found {len(leads)} leads to process")
-        
-        for lead in leads:
-            try:
-                # Mark as in progress to prevent duplicate processing
-                lead.status = "in_progress"
-                db.commit()
-
-                logger.info(f"Processing lead {lead.id}: {lead.lead_name}")
-                
-                # Use default values if not provided
-                offer = lead.product_desc or DEFAULT_OFFER
-                cta = lead.cta or DEFAULT_CTA
-                
-                # Generate email
-                result = email_service.generate_email(
-                    snapshot_id=lead.snapshot_id,
-                    lead_name=lead.lead_name,
-                    linkedin_url=lead.linkedin_url,
-                    offer=offer,
-                    cta=cta,
-                    seller_name=DEFAULT_SELLER_NAME
+        else:
+            if email_service.profile_index.lookups:
+                logger.info(
+                    "Profile analysis reuse rate: %.1f%% (%s/%s)",
+                    100 * email_service.profile_index.reuse_rate,
+                    email_service.profile_index.reused,
+                    email_service.profile_index.lookups
+                )
+            if email_service.quality_gate.checked:
+                logger.info(
+                    "Skipped LLM quality control for %.1f%% of emails (%s/%s)",
+                    100 * email_service.quality_gate.skip_rate,
+                    email_service.quality_gate.skipped,
+                    email_service.quality_gate.checked
                 )
-                
-                if result.get("status") == "error":
-                    logger.error(f"Error generating email for lead {lead.id}: {result.get('message')}")
-                    lead.status = "error"
-                    lead.error_message = result.get("message", "Unknown error")
-                    db.commit()
-                    continue
-                
-                # Update lead with generated email
-                lead.generated_email_greeting = f"Hello {lead.lead_name}"
-                lead.generated_email_hook = result.get("subject", "")
-                lead.generated_email_body = result.get("body", "")
-                
-                # Validate email body
-                if not lead.generated_email_body:
-                    raise ValueError("Generated email body is empty")
-                
-                lead.status = "done"
-                db.commit()
-                logger.info(f"Successfully processed lead {lead.id}: {lead.lead_name}")
-                
-            except Exception as e:
-                logger.error(f"Error processing lead {lead.id}: {str(e)}")
-                logger.error(traceback.format_exc())
-                lead.status = "error"
-                lead.error_message = str(e)
-                db.commit()
+            parse_outcomes = {
+                outcome: int(count - parse_outcomes_before[outcome])
+                for outcome, count in parse_outcome_counts().items()
+            }
+            logger.info("Final email parse outcomes: %s", parse_outcomes)
 
     except Exception as e:
-        logger.error(f"Job failed: {str(e)}")
+        logger.error("Job failed: %s", e)
         logger.error(traceback.format_exc())
     finally:
-        db.close()
         logger.info("Email generation job completed")
+    return processed
 
 if __name__ == "__main__":
     run_email_generation_job()
\ No newline at end of file
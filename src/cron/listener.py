@@ -0,0 +1,96 @@
+import os
+import time
+import logging
+import threading
+from typing import List, Optional
+
+from src.db.notifications import (
+    LeadNotificationListener,
+    install_lead_ready_trigger,
+    supports_notifications
+)
+from src.db.session import engine
+from src.db.schema import create_schema
+from src.service.email_generation_service import EmailGenerationService
+from src.cron.cron import LEAD_SETTLE_DELAY_SECONDS, run_email_generation_job
+
+logger = logging.getLogger(__name__)
+
+# Poll anyway this often, in case notifications were missed (e.g. while no worker was connected)
+LISTENER_FALLBACK_POLL_SECONDS = float(os.getenv("LISTENER_FALLBACK_POLL_SECONDS", "300"))
+# Back-off before reconnecting after the LISTEN connection fails
+LISTENER_RECONNECT_SECONDS = 5.0
+# Longest a single LISTEN wait blocks before re-checking for a stop request
+LISTENER_STOP_CHECK_SECONDS = 1.0
+
+
+def _wait_for_notifications(listener: LeadNotificationListener,
+                            timeout: float,
+                            stop_event: threading.Event) -> Optional[List[str]]:
+    """`listener.wait` in short slices so a stop request isn't held up by the fallback poll interval"""
+    deadline = time.monotonic() + timeout
+    while not stop_event.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        payloads = listener.wait(min(remaining, LISTENER_STOP_CHECK_SECONDS))
+        if payloads != []:
+            return payloads
+    return []
+
+
+def run_listener(stop_event: Optional[threading.Event] = None,
+                 email_service: Optional[EmailGenerationService] = None,
+                 prepare_schema: bool = True):
+    """
+    Long-running worker: process leads as soon as a lead-ready notification
+    arrives, with a slow fallback poll. Falls back to pure polling on
+    databases without LISTEN/NOTIFY.
+
+    Args:
+        stop_event: Set to drain: the current lead finishes, claimed but
+            unstarted leads are released, and the function returns
+        email_service: Optional pre-configured service
+        prepare_schema: Create tables and the notify trigger first; the
+            supervisor does this once instead of in every worker
+    """
+    stop_event = stop_event or threading.Event()
+
+    # Create tables and the notify trigger if they don't exist
+    if prepare_schema:
+        create_schema(engine)
+        install_lead_ready_trigger(engine)
+
+    email_service = email_service or EmailGenerationService()
+    listener = LeadNotificationListener(engine) if supports_notifications(engine) else None
+
+    # Catch up on anything that arrived while no worker was listening
+    run_email_generation_job(email_service, stop_event=stop_event)
+
+    try:
+        while not stop_event.is_set():
+            payloads = (
+                _wait_for_notifications(listener, LISTENER_FALLBACK_POLL_SECONDS, stop_event)
+                if listener else None
+            )
+
+            if payloads:
+                logger.info("Woken by %s lead notification(s), settling", len(payloads))
+                # Small margin over the settle delay covers app/database clock skew
+                stop_event.wait(LEAD_SETTLE_DELAY_SECONDS + 1)
+            elif payloads is None:
+                stop_event.wait(LISTENER_RECONNECT_SECONDS if listener else LISTENER_FALLBACK_POLL_SECONDS)
+            else:
+                logger.info("No notifications, running fallback poll")
+
+            if stop_event.is_set():
+                break
+            run_email_generation_job(email_service, stop_event=stop_event)
+    finally:
+        if listener:
+            listener.close()
+        logger.info("Lead listener stopped")
+
+
+if __name__ == "__main__":
+    run_listener()
@@ -0,0 +1,193 @@
+import os
+import math
+import time
+import signal
+import logging
+import threading
+import multiprocessing
+from typing import Dict, List
+
+from src.db.session import SessionLocal, engine
+from src.db.schema import create_schema
+from src.db.notifications import install_lead_ready_trigger
+from src.logging_config import configure_logging
+from src.model.lead_email_details import LeadEmailDetails
+from src.service.lead_scheduler import lease_cutoff, lease_expired
+
+# Configure logging
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# Ceiling and floor on the number of worker processes. The ceiling is bounded by
+# memory, not CPU: each worker is ~200 MB RSS from imports alone, and on Heroku
+# os.cpu_count() reports the host's cores, not the dyno's share. Raise it only
+# as far as the dyno's memory quota allows.
+WORKER_MAX_PROCESSES = int(os.getenv("WORKER_MAX_PROCESSES", "2"))
+WORKER_MIN_PROCESSES = int(os.getenv("WORKER_MIN_PROCESSES", "1"))
+# Backlog each worker is expected to handle before another one is added
+WORKER_LEADS_PER_PROCESS = int(os.getenv("WORKER_LEADS_PER_PROCESS", "20"))
+# How often the backlog is re-read and the pool resized
+WORKER_SCALE_INTERVAL_SECONDS = float(os.getenv("WORKER_SCALE_INTERVAL_SECONDS", "30"))
+# How often dead workers are noticed and replaced
+WORKER_MONITOR_INTERVAL_SECONDS = float(os.getenv("WORKER_MONITOR_INTERVAL_SECONDS", "5"))
+# Heroku sends SIGKILL 30 seconds after SIGTERM
+WORKER_SHUTDOWN_GRACE_SECONDS = float(os.getenv("WORKER_SHUTDOWN_GRACE_SECONDS", "25"))
+
+
+def desired_process_count(backlog: int,
+                          min_processes: int = WORKER_MIN_PROCESSES,
+                          max_processes: int = WORKER_MAX_PROCESSES,
+                          leads_per_process: int = WORKER_LEADS_PER_PROCESS) -> int:
+    """Workers needed for a backlog, clamped to [min_processes, max_processes]"""
+    wanted = math.ceil(backlog / max(1, leads_per_process))
+    return max(min_processes, min(max_processes, wanted))
+
+
+def count_backlog() -> int:
+    """Number of leads waiting to be generated"""
+    db = SessionLocal()
+    try:
+        return db.query(LeadEmailDetails).filter(
+            (LeadEmailDetails.status == "not_started") | lease_expired(lease_cutoff())
+        ).count()
+    finally:
+        db.close()
+
+
+def _worker_main(slot: int):
+    """Entry point of a worker process: a lead listener that drains on SIGTERM"""
+    from src.cron.listener import run_listener
+
+    configure_logging()
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Worker %s received signal %s, draining", slot, signum)
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    logger.info("Worker %s started (pid %s)", slot, os.getpid())
+    run_listener(stop_event=stop_event, prepare_schema=False)
+
+
+class WorkerSupervisor:
+    """
+    Runs lead listeners in separate processes so snapshot parsing, model
+    building and crew orchestration can use more than one core. The pool is
+    sized from the backlog, crashed workers are replaced, and SIGTERM drains
+    every worker before exiting.
+    """
+
+    def __init__(self,
+                 min_processes: int = WORKER_MIN_PROCESSES,
+                 max_processes: int = WORKER_MAX_PROCESSES,
+                 leads_per_process: int = WORKER_LEADS_PER_PROCESS,
+                 scale_interval_seconds: float = WORKER_SCALE_INTERVAL_SECONDS,
+                 monitor_interval_seconds: float = WORKER_MONITOR_INTERVAL_SECONDS,
+                 shutdown_grace_seconds: float = WORKER_SHUTDOWN_GRACE_SECONDS):
+        self.min_processes = max(1, min_processes)
+        self.max_processes = max(self.min_processes, max_processes)
+        self.leads_per_process = leads_per_process
+        self.scale_interval_seconds = scale_interval_seconds
+        self.monitor_interval_seconds = monitor_interval_seconds
+        self.shutdown_grace_seconds = shutdown_grace_seconds
+
+        # Spawn rather than fork: the parent holds pooled DB connections and
+        # the logging thread, neither of which survives a fork cleanly
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._draining: List[multiprocessing.process.BaseProcess] = []
+        self._stop_event = threading.Event()
+        self._target = self.min_processes
+
+    def stop(self, signum=None, frame=None):
+        logger.info("Supervisor received signal %s, shutting down", signum)
+        self._stop_event.set()
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        # Once here, so workers don't race each other on DDL
+        create_schema(engine)
+        install_lead_ready_trigger(engine)
+        # The children open their own connections
+        engine.dispose()
+
+        last_scaled = 0.0
+        try:
+            while not self._stop_event.is_set():
+                self._reap()
+                if time.monotonic() - last_scaled >= self.scale_interval_seconds:
+                    self._rescale()
+                    last_scaled = time.monotonic()
+                self._fill()
+                self._stop_event.wait(self.monitor_interval_seconds)
+        finally:
+            self._shutdown()
+
+    def _rescale(self):
+        try:
+            backlog = count_backlog()
+        except Exception as e:
+            # Keep the current size if the database is briefly unreachable
+            logger.error("Could not read lead backlog: %s", e)
+            return
+        target = desired_process_count(backlog, self.min_processes, self.max_processes, self.leads_per_process)
+        if target != self._target:
+            logger.info("Backlog %s leads, scaling workers %s -> %s", backlog, self._target, target)
+        self._target = target
+
+        # Drain the highest slots first; they finish their current lead and exit
+        for slot in sorted(self._workers, reverse=True):
+            if len(self._workers) <= self._target:
+                break
+            process = self._workers.pop(slot)
+            process.terminate()
+            self._draining.append(process)
+
+    def _fill(self):
+        for slot in range(self._target):
+            if slot not in self._workers:
+                process = self._context.Process(target=_worker_main, args=(slot,), name=f"lead-worker-{slot}")
+                process.start()
+                self._workers[slot] = process
+
+    def _reap(self):
+        for slot, process in list(self._workers.items()):
+            if not process.is_alive():
+                process.join()
+                # Leads a crashed worker held are reclaimed once their claim lease expires
+                log = logger.error if process.exitcode else logger.info
+                log("Worker %s (pid %s) exited with code %s, restarting", slot, process.pid, process.exitcode)
+                del self._workers[slot]
+        for process in list(self._draining):
+            if not process.is_alive():
+                process.join()
+                self._draining.remove(process)
+
+    def _shutdown(self):
+        processes = list(self._workers.values()) + self._draining
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + self.shutdown_grace_seconds
+        for process in processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+
+        for process in processes:
+            if process.is_alive():
+                # Its in-flight lead is reclaimed after LEAD_CLAIM_LEASE_SECONDS
+                logger.error("Worker pid %s did not drain in %ss, killing", process.pid, self.shutdown_grace_seconds)
+                process.kill()
+                process.join()
+        self._workers.clear()
+        self._draining.clear()
+        logger.info("Supervisor stopped")
+
+
+if __name__ == "__main__":
+    WorkerSupervisor().run()
@@ -0,0 +1,98 @@
+# backend/db/notifications.py
+
+import select
+import logging
+from typing import List, Optional
+
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Channel notified with the lead id whenever a row is inserted or updated as "not_started"
+LEAD_READY_CHANNEL = "lead_email_details_ready"
+
+LEAD_READY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_lead_email_details_ready() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{LEAD_READY_CHANNEL}', NEW.id::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS lead_email_details_ready ON lead_email_details;
+
+CREATE TRIGGER lead_email_details_ready
+    AFTER INSERT OR UPDATE ON lead_email_details
+    FOR EACH ROW
+    WHEN (NEW.status = 'not_started')
+    EXECUTE PROCEDURE notify_lead_email_details_ready();
+"""
+
+
+def supports_notifications(engine: Engine) -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def install_lead_ready_trigger(engine: Engine):
+    """Create (or replace) the NOTIFY trigger on lead_email_details; no-op off Postgres"""
+    if not supports_notifications(engine):
+        return
+    with engine.begin() as conn:
+        conn.exec_driver_sql(LEAD_READY_TRIGGER_SQL)
+
+
+class LeadNotificationListener:
+    """Holds a dedicated LISTEN connection and waits for lead-ready notifications"""
+
+    def __init__(self, engine: Engine, channel: str = LEAD_READY_CHANNEL):
+        self.engine = engine
+        self.channel = channel
+        self._raw_connection = None
+        self._connection = None
+
+    def connect(self):
+        self.close()
+        self._raw_connection = self.engine.raw_connection()
+        self._connection = self._raw_connection.driver_connection
+        self._connection.autocommit = True
+        with self._connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        logger.info("Listening for notifications on %s", self.channel)
+
+    def wait(self, timeout: float) -> Optional[List[str]]:
+        """
+        Block up to `timeout` seconds for notifications
+
+        Returns:
+            List of notification payloads (lead ids), empty on timeout,
+            or None if the connection failed and polling should take over
+        """
+        try:
+            if self._connection is None:
+                self.connect()
+            if self._connection.notifies:
+                return self._drain()
+            ready, _, _ = select.select([self._connection], [], [], timeout)
+            if not ready:
+                return []
+            self._connection.poll()
+            return self._drain()
+        except Exception as e:
+            logger.error("Notification listener failed, reconnecting on next wait: %s", e)
+            self.close()
+            return None
+
+    def _drain(self) -> List[str]:
+        payloads = [notify.payload for notify in self._connection.notifies]
+        self._connection.notifies.clear()
+        return payloads
+
+    def close(self):
+        if self._raw_connection is not None:
+            try:
+                # The connection is in LISTEN state, don't hand it back to the pool
+                self._raw_connection.invalidate()
+            except Exception:
+                pass
+        self._raw_connection = None
+        self._connection = None
@@ -0,0 +1,50 @@
+# backend/db/schema.py
+
+import logging
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+
+from src.db.base import Base
+
+# Import every model so its table is registered on Base.metadata
+from src.model import (  # noqa: F401
+    email_generation_cache,
+    lead_email_details,
+    lead_email_variant,
+    lead_generation_metric,
+    profile_analysis_record
+)
+
+logger = logging.getLogger(__name__)
+
+
+def create_schema(engine: Engine):
+    """
+    Create missing tables, then add columns and indexes introduced after a
+    table was first created (create_all never alters existing tables)
+    """
+    Base.metadata.create_all(bind=engine)
+
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+            if column.server_default is not None:
+                ddl += f" DEFAULT {column.server_default.arg}"
+            if not column.nullable and column.server_default is not None:
+                ddl += " NOT NULL"
+            logger.info("Adding column %s.%s", table.name, column.name)
+            with engine.begin() as conn:
+                conn.exec_driver_sql(ddl)
+
+        # IF NOT EXISTS rather than checkfirst: reflection skips expression indexes
+        with engine.begin() as conn:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, TextIO
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "json" for one structured object per line, "text" for the classic format
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+# Fraction of leads whose crew runs with verbose (stdout) agent output
+LOG_VERBOSE_SAMPLE_RATE = float(os.getenv("LOG_VERBOSE_SAMPLE_RATE", "0"))
+# Records buffered for the writer thread; beyond this new records are dropped and counted
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["_DeferredQueueHandler"] = None
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; `extra=` fields become top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting (timestamps, JSON, tracebacks) to the
+    listener thread; the stock handler runs the whole formatter in the caller.
+    Never blocks: when the queue is full the record is dropped and counted.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, as the stock handler does: they may be
+        # mutated before the listener gets to the record
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Blocking put: the stock put_nowait fails while the queue is full
+        self.queue.put(self._sentinel)
+
+
+def configure_logging(stream: Optional[TextIO] = None,
+                      level: Optional[str] = None,
+                      fmt: Optional[str] = None,
+                      use_queue: bool = True):
+    """
+    Route all logging through a non-blocking queue drained by a background
+    thread. Only the first call in a process takes effect.
+
+    With `use_queue=False` this is the classic synchronous setup: the same
+    handler and format `logging.basicConfig` produces, writing in the caller.
+    """
+    global _listener, _queue_handler, _configured
+    if _configured:
+        return
+    _configured = True
+
+    json_format = (fmt or LOG_FORMAT) == "json"
+    if not use_queue:
+        logging.basicConfig(level=level or LOG_LEVEL, stream=stream,
+                            format=None if json_format else TEXT_FORMAT, force=True)
+        if json_format:
+            logging.getLogger().handlers[0].setFormatter(JsonFormatter())
+        return
+
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    _listener = _QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def dropped_log_records() -> int:
+    """Records dropped because the queue was full"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        dropped = dropped_log_records()
+        if dropped:
+            for handler in _listener.handlers:
+                handler.handle(logging.makeLogRecord({
+                    "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                    "msg": "Dropped %s log records: queue full", "args": (dropped,)
+                }))
+        _listener = None
+
+
+# Whether the lead currently being generated was sampled for verbose output
+_verbose: ContextVar[bool] = ContextVar("verbose_lead_logging", default=False)
+
+
+def sample_verbose() -> bool:
+    return LOG_VERBOSE_SAMPLE_RATE > 0 and random.random() < LOG_VERBOSE_SAMPLE_RATE
+
+
+@contextmanager
+def verbose_logging(enabled: bool):
+    token = _verbose.set(enabled)
+    try:
+        yield
+    finally:
+        _verbose.reset(token)
+
+
+def is_verbose() -> bool:
+    return _verbose.get()
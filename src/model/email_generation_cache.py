@@ -0,0 +1,25 @@
+# backend/model/email_generation_cache.py
+
+from sqlalchemy import (
+    Column,
+    String,
+    DateTime,
+    Text
+)
+from sqlalchemy.sql import func
+from src.db.base import Base
+
+class EmailGenerationCache(Base):
+    """Final generated email keyed on its inputs and the prompt version"""
+    __tablename__ = "email_generation_cache"
+    __table_args__ = {'extend_existing': True}
+
+    cache_key = Column(String, primary_key=True)
+    prompt_version = Column(String, nullable=False, index=True)
+
+    subject = Column(Text, nullable=False)
+    body = Column(Text, nullable=False)
+    raw_result = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,22 @@
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class GeneratedEmail(BaseModel):
+    """Schema the final generation stages must return"""
+    subject: str
+    body: str
+
+    @field_validator("subject", "body")
+    @classmethod
+    def not_blank(cls, value: str) -> str:
+        value = value.strip()
+        if not value:
+            raise ValueError("must not be empty")
+        return value
+
+
+class GeneratedEmailVariants(BaseModel):
+    """Schema of a multi-variant email creation response"""
+    variants: List[GeneratedEmail] = Field(min_length=1)
@@ -2,12 +2,13 @@
 
 from sqlalchemy import (
     Column,
+    Index,
     Integer,
     String,
     DateTime,
     Text
 )
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column
 from src.db.base import Base
 from datetime import datetime
 
@@ -25,12 +26,31 @@ class LeadEmailDetails(Base):
     product_desc = Column(String, nullable=True)
     cta = Column(String, nullable=True)
     email_salutation = Column(String, nullable=True)
+    seller_name = Column(String, nullable=True)
+    # Number of A/B variants to generate; extras are stored in lead_email_variants
+    variant_count = Column(Integer, default=1, server_default="1", nullable=False)
 
-    status = Column(String, default="not_started", nullable=False)
+    status = Column(String, default="not_started", nullable=False, index=True)
+    # When the current "in_progress" claim was taken or last renewed; expired claims are reclaimed
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+    # Why the last generation attempt failed (status "error")
+    error_message = Column(Text, nullable=True)
+
+    # Scheduling: higher priority first, then fair share across tenants
+    # (falls back to snapshot_id / company_name when no tenant key is set)
+    priority = Column(Integer, default=0, server_default="0", nullable=False, index=True)
+    tenant_key = Column(String, nullable=True, index=True)
     
     generated_email_greeting = Column(String, nullable=True)
     generated_email_hook = Column(String, nullable=True)
     generated_email_body = Column(String, nullable=True)
+
+    # Intermediate stage outputs, each tagged with a hash of the inputs it was
+    # generated from, so regeneration only reruns stages whose inputs changed
+    profile_analysis_result = Column(Text, nullable=True)
+    profile_analysis_key = Column(String, nullable=True)
+    company_analysis_result = Column(Text, nullable=True)
+    company_analysis_key = Column(String, nullable=True)
     
     snapshot_id = Column(String, nullable=True)
 
@@ -41,3 +61,19 @@ class LeadEmailDetails(Base):
         onupdate=func.now(),
         nullable=False
     )
+
+
+# Serves the scheduler's per-(priority, share key) head reads; the expression
+# matches src.service.lead_scheduler.share_key_expression
+Index(
+    "ix_lead_email_details_claim_order",
+    LeadEmailDetails.status,
+    LeadEmailDetails.priority,
+    func.coalesce(
+        LeadEmailDetails.tenant_key,
+        LeadEmailDetails.snapshot_id,
+        LeadEmailDetails.company_name,
+        literal_column("''")
+    ),
+    LeadEmailDetails.id
+)
@@ -0,0 +1,26 @@
+# backend/model/lead_email_variant.py
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    ForeignKey
+)
+from sqlalchemy.sql import func
+from src.db.base import Base
+
+class LeadEmailVariant(Base):
+    """One of several A/B subject/body variants generated for a lead"""
+    __tablename__ = "lead_email_variants"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    lead_id = Column(Integer, ForeignKey("lead_email_details.id", ondelete="CASCADE"), nullable=False, index=True)
+    variant_index = Column(Integer, nullable=False)
+
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,30 @@
+# backend/model/lead_generation_metric.py
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Float
+)
+from sqlalchemy.sql import func
+from src.db.base import Base
+
+class LeadGenerationMetric(Base):
+    """One timed pipeline stage (S3 fetch, parse, crew task, write-back) for one lead"""
+    __tablename__ = "lead_generation_metrics"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    lead_id = Column(Integer, nullable=True, index=True)
+    stage = Column(String, nullable=False, index=True)
+    status = Column(String, default="ok", nullable=False)
+
+    duration_ms = Column(Float, default=0.0, nullable=False)
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, default=0, nullable=False)
+    completion_tokens = Column(Integer, default=0, nullable=False)
+    cost_usd = Column(Float, default=0.0, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -74,7 +74,8 @@ class LinkedInProfile(BaseModel):
     @classmethod
     def from_s3_data(cls, data: Dict[str, Any]) -> "LinkedInProfile":
         """Create a LinkedInProfile instance from the S3 data format"""
-        logger.debug(f"Creating LinkedInProfile from data: {json.dumps(data, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Creating LinkedInProfile from data: %s", json.dumps(data, indent=2))
         
         # Ensure data is not None
         if data is None:
@@ -135,8 +136,8 @@ class LinkedInProfile(BaseModel):
         profile.llm_linkedin_person_input = profile._format_person_input()
         profile.llm_linkedin_company_input = profile._format_company_input()
         
-        logger.debug(f"Created profile with person input: {profile.llm_linkedin_person_input}")
-        logger.debug(f"Created profile with company input: {profile.llm_linkedin_company_input}")
+        logger.debug("Created profile with person input: %s", profile.llm_linkedin_person_input)
+        logger.debug("Created profile with company input: %s", profile.llm_linkedin_company_input)
         
         return profile
     
@@ -257,7 +258,7 @@ Company Description: {company_description}
                 # Handle case where skill is just a string
                 skills.append(skill)
                 
-        logger.debug(f"Extracted skills: {skills}")
+        logger.debug("Extracted skills: %s", skills)
         return skills
 
     @staticmethod
@@ -277,5 +278,5 @@ Company Description: {company_description}
                 if language["title"]:  # Only add if we have at least a language name
                     languages.append(language)
                     
-        logger.debug(f"Extracted languages: {languages}")
+        logger.debug("Extracted languages: %s", languages)
         return languages
\ No newline at end of file
@@ -0,0 +1,29 @@
+# backend/model/profile_analysis_record.py
+
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    DateTime,
+    Text
+)
+from sqlalchemy.sql import func
+from src.db.base import Base
+
+class ProfileAnalysisRecord(Base):
+    """Stored profile_analysis_task output with the MinHash signature of the analyzed profile"""
+    __tablename__ = "profile_analysis_records"
+    __table_args__ = {'extend_existing': True}
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Hash of the offer and prompt version the analysis was produced for
+    offer_key = Column(String, nullable=False, index=True)
+    # Normalized profile URL (or name) of the analyzed person; analyses are only reused for the same person
+    person_key = Column(String, nullable=True)
+    profile_hash = Column(String, nullable=False)
+    # JSON list of MinHash values
+    signature = Column(Text, nullable=False)
+    analysis = Column(Text, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+import logging
+import traceback
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from src.db.session import SessionLocal
+from src.model.email_generation_cache import EmailGenerationCache
+from src.model.linkedin_profile import LinkedInProfile
+from src.agents.prompt_config import EMAIL_PROMPT_VERSION
+from src.service.metrics_service import counters
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+EMAIL_CACHE_ENABLED = os.getenv("EMAIL_CACHE_ENABLED", "true").lower() == "true"
+EMAIL_CACHE_TTL_SECONDS = int(os.getenv("EMAIL_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+
+def profile_content_hash(profile: LinkedInProfile) -> str:
+    """Hash of the rendered profile text the prompts actually see"""
+    content = f"{profile.llm_linkedin_person_input or ''}\x00{profile.llm_linkedin_company_input or ''}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class EmailCacheService:
+    """DB-backed cache of final generated emails with a TTL"""
+
+    def __init__(self,
+                 session_factory=SessionLocal,
+                 ttl_seconds: int = EMAIL_CACHE_TTL_SECONDS,
+                 enabled: bool = EMAIL_CACHE_ENABLED,
+                 prompt_version: str = EMAIL_PROMPT_VERSION):
+        self.session_factory = session_factory
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.prompt_version = prompt_version
+
+    def build_key(self,
+                  profile: LinkedInProfile,
+                  lead_name: str,
+                  offer: str,
+                  cta: str,
+                  seller_name: str) -> str:
+        """
+        Cache key over every generation input. The prompt version is part of
+        the key, so editing a prompt never serves emails from the old one.
+        """
+        # lead_name is included because it is rendered into the email prompt
+        parts = [self.prompt_version, profile_content_hash(profile), lead_name or "", offer, cta, seller_name]
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached email for a key if present and not expired"""
+        if not self.enabled:
+            return None
+        db = self.session_factory()
+        try:
+            entry = (
+                db.query(EmailGenerationCache)
+                .filter(
+                    EmailGenerationCache.cache_key == cache_key,
+                    EmailGenerationCache.expires_at > datetime.utcnow()
+                )
+                .first()
+            )
+            outcome = "hit" if entry else "miss"
+            counters.inc("zylo_email_cache_lookups_total", help_text="Whole-email cache lookups", outcome=outcome)
+            if not entry:
+                return None
+            return {
+                "subject": entry.subject,
+                "body": entry.body,
+                "raw_result": entry.raw_result,
+            }
+        except Exception as e:
+            # The cache must never fail a generation
+            logger.error("Email cache lookup failed: %s", e)
+            return None
+        finally:
+            db.close()
+
+    def set(self, cache_key: str, subject: str, body: str, raw_result: Optional[str] = None):
+        """Store (or refresh) a generated email"""
+        if not self.enabled:
+            return
+        db = self.session_factory()
+        try:
+            db.merge(EmailGenerationCache(
+                cache_key=cache_key,
+                prompt_version=self.prompt_version,
+                subject=subject,
+                body=body,
+                raw_result=raw_result,
+                expires_at=datetime.utcnow() + timedelta(seconds=self.ttl_seconds)
+            ))
+            db.commit()
+        except Exception as e:
+            logger.error("Email cache write failed: %s", e)
+            logger.debug(traceback.format_exc())
+            db.rollback()
+        finally:
+            db.close()
+
+    def purge_expired(self) -> int:
+        """Delete expired entries and entries from other prompt versions"""
+        if not self.enabled:
+            return 0
+        db = self.session_factory()
+        try:
+            deleted = (
+                db.query(EmailGenerationCache)
+                .filter(
+                    (EmailGenerationCache.expires_at <= datetime.utcnow())
+                    | (EmailGenerationCache.prompt_version != self.prompt_version)
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            if deleted:
+                logger.info("Purged %s stale email cache entries", deleted)
+            return deleted
+        except Exception as e:
+            # A failed purge only leaves stale rows behind; never fail the job over it
+            logger.error("Email cache purge failed: %s", e)
+            logger.debug(traceback.format_exc())
+            db.rollback()
+            return 0
+        finally:
+            db.close()
@@ -1,26 +1,82 @@
+import os
+import json
 import logging
-from typing import Dict, Tuple, Optional, Any
+from typing import Callable, Dict, List, Tuple, Optional, Any
 from crewai import Crew, Agent, Task
 import traceback
 
 from src.model.linkedin_profile import LinkedInProfile
 from src.service.linkedin_client_service import LinkedInClientService
+from src.service.email_cache_service import EmailCacheService
+from src.service.profile_similarity_service import ProfileSimilarityService, person_key
+from src.service.email_quality_validator import EmailQualityGate
+from src.service.llm_resilience import LLM_RESILIENCE_ENABLED, CircuitOpenError, ResilientStageRunner
+from src.service.metrics_service import (
+    LeadMetrics, counters, lead_metrics_context, track_stage, record_usage, record_outcome
+)
 from src.agents.prompt_config import (
     email_agents, 
-    email_tasks, 
     task_agent_mapping,
-    parse_email
+    parse_email,
+    parse_email_json,
+    parse_email_variants_json
 )
+from src.agents.prompt_registry import prompt_registry
+from src.logging_config import is_verbose, sample_verbose, verbose_logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# A stage runner executes one crew task: (stage_name, description, expected_output) -> raw output
+StageRunner = Callable[[str, str, str], str]
+# Stored stage outputs: {stage_name: {"key": input key, "result": output}}
+StageOutputs = Dict[str, Dict[str, str]]
+
+# Upper bound on A/B variants generated per lead
+MAX_EMAIL_VARIANTS = int(os.getenv("MAX_EMAIL_VARIANTS", "5"))
+
+
+def record_parse_outcome(outcome: str):
+    """
+    Count how the final stage output parsed, in the process counters and as an
+    "email_parse" metrics row of the current lead, so the DB-backed dump
+    aggregates outcomes across worker processes
+    """
+    counters.inc("zylo_email_parse_total", help_text="Final email parse outcomes", outcome=outcome)
+    record_outcome("email_parse", outcome)
+
+
 class EmailGenerationService:
     """Service for generating personalized cold emails"""
     
-    def __init__(self):
-        """Initialize the email generation service"""
-        self.linkedin_service = LinkedInClientService()
+    def __init__(self,
+                 linkedin_service: Optional[LinkedInClientService] = None,
+                 stage_runner: Optional[StageRunner] = None,
+                 result_cache: Optional[EmailCacheService] = None,
+                 profile_index: Optional[ProfileSimilarityService] = None,
+                 quality_gate: Optional[EmailQualityGate] = None):
+        """
+        Initialize the email generation service
+
+        Args:
+            linkedin_service: Optional LinkedIn client, defaults to the S3-backed client
+            stage_runner: Optional callable used to execute each crew task,
+                defaults to running the task through a single-task crewai Crew
+            result_cache: Optional whole-email cache, defaults to the DB-backed cache
+            profile_index: Optional near-duplicate profile index used to reuse
+                prior profile analyses, defaults to the DB-backed MinHash index
+            quality_gate: Optional local QC gate deciding when the LLM QC stage runs
+
+        The stage runner is wrapped with per-stage deadlines, hedging and a
+        circuit breaker unless LLM_RESILIENCE_ENABLED is false.
+        """
+        self.linkedin_service = linkedin_service or LinkedInClientService()
+        self.stage_runner = stage_runner or self._run_crew_stage
+        if LLM_RESILIENCE_ENABLED:
+            self.stage_runner = ResilientStageRunner(self.stage_runner)
+        self.result_cache = result_cache if result_cache is not None else EmailCacheService()
+        self.profile_index = profile_index if profile_index is not None else ProfileSimilarityService()
+        self.quality_gate = quality_gate or EmailQualityGate()
     
     def generate_email(self, 
                       snapshot_id: str,
@@ -28,7 +84,12 @@ class EmailGenerationService:
                       linkedin_url: Optional[str] = None,
                       offer: str = "",
                       cta: str = "",
-                      seller_name: str = "Sales Team") -> Dict[str, str]:
+                      seller_name: str = "Sales Team",
+                      profile: Optional[LinkedInProfile] = None,
+                      metrics: Optional[LeadMetrics] = None,
+                      stage_outputs: Optional[StageOutputs] = None,
+                      variant_count: int = 1,
+                      refresh: bool = False) -> Dict[str, Any]:
         """
         Generate a personalized cold email based on LinkedIn profile
         
@@ -39,50 +100,121 @@ class EmailGenerationService:
             offer: The offer description
             cta: Call to action
             seller_name: Name of the seller
+            profile: Optional profile already fetched from the snapshot (the
+                job pipeline prefetches it), skips the S3 fetch
+            metrics: Optional metrics to continue, e.g. holding the prefetch timings
+            stage_outputs: Outputs stored from an earlier run of this lead,
+                {stage_name: {"key": input key, "result": output}}; analysis
+                stages whose input key still matches are not rerun
+            variant_count: Number of A/B variants to write in one email-creation
+                call (capped at MAX_EMAIL_VARIANTS); the analyses run once
+            refresh: Skip the result cache lookup and regenerate, replacing the
+                cached email (a forced regeneration)
             
         Returns:
-            Dict containing subject, body and raw_result
+            Dict containing subject, body, raw_result, the analysis stage
+            outputs to store for later regeneration and the lead's stage
+            metrics; with variants, also "variants" as a list of
+            {"subject", "body"} whose first entry is the subject/body
+
+        Raises:
+            CircuitOpenError: If the LLM circuit breaker is open
+        """
+        metrics = metrics or LeadMetrics()
+        # Only a sample of leads get verbose crew output
+        with lead_metrics_context(metrics), verbose_logging(sample_verbose()):
+            result = self._generate_email(
+                snapshot_id=snapshot_id,
+                lead_name=lead_name,
+                linkedin_url=linkedin_url,
+                offer=offer,
+                cta=cta,
+                seller_name=seller_name,
+                profile=profile,
+                stage_outputs=stage_outputs,
+                variant_count=max(1, min(variant_count or 1, MAX_EMAIL_VARIANTS)),
+                refresh=refresh
+            )
+        result["metrics"] = metrics
+        return result
+
+    def _generate_email(self,
+                        snapshot_id: str,
+                        lead_name: str,
+                        linkedin_url: Optional[str],
+                        offer: str,
+                        cta: str,
+                        seller_name: str,
+                        profile: Optional[LinkedInProfile] = None,
+                        stage_outputs: Optional[StageOutputs] = None,
+                        variant_count: int = 1,
+                        refresh: bool = False) -> Dict[str, Any]:
+        """
+        Run the generation pipeline for one lead inside an active metrics context
         """
         try:
             # Fetch LinkedIn profile data
-            profile = self.linkedin_service.get_linkedin_profile(snapshot_id, linkedin_url)
+            if profile is None:
+                with track_stage("get_linkedin_profile"):
+                    profile = self.linkedin_service.get_linkedin_profile(snapshot_id, linkedin_url)
             
             if not profile:
-                error_msg = f"Failed to retrieve LinkedIn profile for {lead_name} (snapshot: {snapshot_id})"
-                logger.error(error_msg)
+                return self.profile_not_found(snapshot_id, lead_name)
+            
+            if variant_count > 1:
+                # The result cache holds single emails, so variants always run the crew
+                return self._generate_variants(profile, lead_name, offer, cta, seller_name,
+                                               variant_count, stage_outputs)
+            
+            # Identical inputs with the same prompt version reuse the stored email
+            cache_key = self.result_cache.build_key(profile, lead_name, offer, cta, seller_name)
+            cached = None
+            if not refresh:
+                with track_stage("result_cache_lookup"):
+                    cached = self.result_cache.get(cache_key)
+            if cached:
+                logger.info("Using cached email for %s", lead_name)
                 return {
-                    "status": "error",
-                    "message": error_msg
+                    "status": "success",
+                    "cached": True,
+                    **cached
                 }
             
             # Create the crew and generate the email
             try:
-                email_result = self._run_email_crew(
+                email_result, stage_outputs = self._run_email_crew(
                     profile=profile,
                     lead_name=lead_name,
                     offer=offer,
                     cta=cta,
-                    seller_name=seller_name
+                    seller_name=seller_name,
+                    stage_outputs=stage_outputs
                 )
                 
                 # Parse the email result
-                subject, body = parse_email(email_result)
+                subject, body = self._parse_email_output(email_result)
                 
                 if not subject or not body:
                     error_msg = "Generated email is missing subject or body"
                     logger.error(error_msg)
                     return {
                         "status": "error",
-                        "message": error_msg
+                        "message": error_msg,
+                        "stage_outputs": stage_outputs
                     }
                 
+                self.result_cache.set(cache_key, subject, body, email_result)
                 return {
                     "status": "success",
                     "subject": subject,
                     "body": body,
-                    "raw_result": email_result
+                    "raw_result": email_result,
+                    "stage_outputs": stage_outputs
                 }
                 
+            except CircuitOpenError:
+                # Not a problem with this lead; callers put it back in the queue
+                raise
             except Exception as e:
                 error_msg = f"Error in email generation crew: {str(e)}"
                 logger.error(error_msg)
@@ -92,6 +224,8 @@ class EmailGenerationService:
                     "message": error_msg
                 }
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
             error_msg = f"Error in email generation process: {str(e)}"
             logger.error(error_msg)
@@ -101,27 +235,30 @@ class EmailGenerationService:
                 "message": error_msg
             }
     
+    @staticmethod
+    def profile_not_found(snapshot_id: str, lead_name: str) -> Dict[str, Any]:
+        """Error result for a lead whose profile isn't in its snapshot"""
+        error_msg = f"Failed to retrieve LinkedIn profile for {lead_name} (snapshot: {snapshot_id})"
+        logger.error(error_msg)
+        return {
+            "status": "error",
+            "message": error_msg
+        }
+
     def _run_email_crew(self, 
                         profile: LinkedInProfile, 
                         lead_name: str,
                         offer: str,
                         cta: str,
-                        seller_name: str) -> str:
+                        seller_name: str,
+                        stage_outputs: Optional[StageOutputs] = None) -> Tuple[str, StageOutputs]:
         """
-        Run the email generation crew
+        Run the email generation crew, one task at a time
+
+        Returns:
+            Tuple: (final stage output, analysis outputs tagged with their input keys)
         """
         try:
-            # Create agents
-            agents = {}
-            for agent_name, agent_config in email_agents.items():
-                agents[agent_name] = Agent(
-                    role=agent_config["role"],
-                    goal=agent_config["goal"],
-                    backstory=agent_config["backstory"],
-                    allow_delegation=agent_config.get("allow_delegation", False),
-                    llm=agent_config["llm"]
-                )
-            
             # Prepare initial task variables
             task_variables = {
                 "lead_name": lead_name,
@@ -132,64 +269,223 @@ class EmailGenerationService:
                 "seller_name": seller_name
             }
             
-            # Create and execute profile analysis task
-            profile_analysis_task = Task(
-                description=email_tasks["profile_analysis_task"]["description"].format(**task_variables),
-                expected_output=email_tasks["profile_analysis_task"]["expected_output"],
-                agent=agents[task_agent_mapping["profile_analysis_task"]]
-            )
-            
-            # Create and execute company analysis task
-            company_analysis_task = Task(
-                description=email_tasks["company_analysis_task"]["description"].format(**task_variables),
-                expected_output=email_tasks["company_analysis_task"]["expected_output"],
-                agent=agents[task_agent_mapping["company_analysis_task"]]
-            )
-            
-            # Create initial crew for analysis
-            analysis_crew = Crew(
-                agents=list(agents.values()),
-                tasks=[profile_analysis_task, company_analysis_task],
-                verbose=True
-            )
-            
-            # Run analysis and get results
-            analysis_results = analysis_crew.kickoff()
+            outputs = self._run_analyses(profile, task_variables, stage_outputs)
             
-            # Update task variables with analysis results
-            task_variables.update({
-                "profile_analysis_result": profile_analysis_task.output if hasattr(profile_analysis_task, 'output') else "",
-                "company_analysis_result": company_analysis_task.output if hasattr(company_analysis_task, 'output') else ""
-            })
-            
-            # Create email creation task
-            email_creation_task = Task(
-                description=email_tasks["email_creation_task"]["description"].format(**task_variables),
-                expected_output=email_tasks["email_creation_task"]["expected_output"],
-                agent=agents[task_agent_mapping["email_creation_task"]]
-            )
-            
-            # Create quality control task
-            quality_control_task = Task(
-                description=email_tasks["quality_control_task"]["description"].format(
-                    email_creation_result="{email_creation_result}"
-                ),
-                expected_output=email_tasks["quality_control_task"]["expected_output"],
-                agent=agents[task_agent_mapping["quality_control_task"]],
-                context=[email_creation_task]
-            )
-            
-            # Create final crew for email generation
-            email_crew = Crew(
-                agents=list(agents.values()),
-                tasks=[email_creation_task, quality_control_task],
-                verbose=True
-            )
-            
-            # Run the crew and return the result
-            return email_crew.kickoff()
+            # Write the email, then run it through quality control unless the
+            # local checks pass and it wasn't sampled for audit
+            task_variables["email_creation_result"] = self._run_stage("email_creation_task", task_variables)
+            subject, body = parse_email_json(task_variables["email_creation_result"])
+            if not subject or not body:
+                subject, body = parse_email(task_variables["email_creation_result"])
+            with track_stage("local_quality_check"):
+                needs_review = self.quality_gate.needs_llm_review(subject, body, cta, seller_name)
+            if not needs_review:
+                return task_variables["email_creation_result"], outputs
+            return self._run_stage("quality_control_task", task_variables), outputs
             
         except Exception as e:
-            logger.error(f"Error in _run_email_crew: {str(e)}")
+            logger.error("Error in _run_email_crew: %s", e)
             logger.error(traceback.format_exc())
-            raise
\ No newline at end of file
+            raise
+
+    def _generate_variants(self,
+                           profile: LinkedInProfile,
+                           lead_name: str,
+                           offer: str,
+                           cta: str,
+                           seller_name: str,
+                           variant_count: int,
+                           stage_outputs: Optional[StageOutputs]) -> Dict[str, Any]:
+        """
+        Run the analyses once, then write `variant_count` variants in a single
+        email-creation call; each variant goes through local QC and, if flagged
+        or sampled, the LLM QC stage on its own
+        """
+        try:
+            task_variables = {
+                "lead_name": lead_name,
+                "linkedin_profile": profile.llm_linkedin_person_input,
+                "company_profile": profile.llm_linkedin_company_input,
+                "offer": offer,
+                "cta": cta,
+                "seller_name": seller_name,
+                "variant_count": variant_count
+            }
+            outputs = self._run_analyses(profile, task_variables, stage_outputs)
+            raw_result = self._run_stage("email_variants_task", task_variables)
+            drafts = parse_email_variants_json(raw_result)[:variant_count]
+            record_parse_outcome("variants" if drafts else "failed")
+            if not drafts:
+                error_msg = "Generated variants response is not valid"
+                logger.error(error_msg)
+                return {
+                    "status": "error",
+                    "message": error_msg,
+                    "stage_outputs": outputs
+                }
+            if len(drafts) < variant_count:
+                logger.warning("Asked for %s email variants, got %s", variant_count, len(drafts))
+
+            variants: List[Dict[str, str]] = []
+            for subject, body in drafts:
+                with track_stage("local_quality_check"):
+                    needs_review = self.quality_gate.needs_llm_review(subject, body, cta, seller_name)
+                if needs_review:
+                    reviewed = self._run_stage("quality_control_task", {
+                        **task_variables,
+                        "email_creation_result": json.dumps({"subject": subject, "body": body})
+                    })
+                    reviewed_subject, reviewed_body = self._parse_email_output(reviewed)
+                    # Keep the draft if the reviewed version can't be parsed
+                    if reviewed_subject and reviewed_body:
+                        subject, body = reviewed_subject, reviewed_body
+                variants.append({"subject": subject, "body": body})
+
+            return {
+                "status": "success",
+                "subject": variants[0]["subject"],
+                "body": variants[0]["body"],
+                "variants": variants,
+                "raw_result": raw_result,
+                "stage_outputs": outputs
+            }
+
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            error_msg = f"Error in email variant generation: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            return {
+                "status": "error",
+                "message": error_msg
+            }
+
+    def _run_analyses(self,
+                      profile: LinkedInProfile,
+                      task_variables: Dict[str, Any],
+                      stage_outputs: Optional[StageOutputs]) -> StageOutputs:
+        """
+        Fill in the profile and company analysis results on `task_variables`
+
+        A stage is skipped when this lead's stored output came from identical
+        inputs; the profile analysis can also come from a near-duplicate
+        profile pitched the same offer
+
+        Returns:
+            StageOutputs: Both analyses tagged with their input keys
+        """
+        offer = task_variables["offer"]
+        outputs: StageOutputs = {}
+        key, analysis = self._stored_output("profile_analysis_task", task_variables, stage_outputs)
+        if analysis is None:
+            person = person_key(profile.url, profile.name)
+            with track_stage("profile_reuse_lookup"):
+                signature = self.profile_index.signature(profile.llm_linkedin_person_input)
+                reused = self.profile_index.find_analysis(signature, offer, person)
+            if reused:
+                analysis, similarity = reused
+                logger.info("Reusing profile analysis of a near-duplicate profile (similarity %.2f)", similarity)
+            else:
+                analysis = self._run_stage("profile_analysis_task", task_variables)
+                self.profile_index.add_analysis(profile.llm_linkedin_person_input, signature, offer, person, analysis)
+        task_variables["profile_analysis_result"] = analysis
+        outputs["profile_analysis_task"] = {"key": key, "result": analysis}
+
+        key, analysis = self._stored_output("company_analysis_task", task_variables, stage_outputs)
+        if analysis is None:
+            analysis = self._run_stage("company_analysis_task", task_variables)
+        task_variables["company_analysis_result"] = analysis
+        outputs["company_analysis_task"] = {"key": key, "result": analysis}
+        return outputs
+
+    @staticmethod
+    def _stored_output(stage_name: str,
+                       task_variables: Dict[str, Any],
+                       stage_outputs: Optional[StageOutputs]) -> Tuple[str, Optional[str]]:
+        """
+        Input key for a stage, and its stored output if that was produced from the same inputs
+        """
+        key = prompt_registry[stage_name].input_key(task_variables)
+        stored = (stage_outputs or {}).get(stage_name) or {}
+        if stored.get("key") == key and stored.get("result"):
+            counters.inc("zylo_stage_reuse_total", help_text="LLM stages skipped because a stored output matched",
+                         stage=stage_name)
+            return key, stored["result"]
+        return key, None
+
+    def _parse_email_output(self, email_result: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Parse the final stage output: schema-validated JSON first, then the
+        legacy Subject:/Email: format, then one repair pass through a cheap model
+        """
+        subject, body = parse_email_json(email_result)
+        outcome = "json"
+
+        if not subject or not body:
+            subject, body = parse_email(email_result)
+            outcome = "legacy"
+
+        if not subject or not body:
+            logger.warning("Email output is not parseable, running repair pass")
+            try:
+                repaired = self._run_stage("email_repair_task", {"raw_output": email_result})
+                subject, body = parse_email_json(repaired)
+                outcome = "repaired"
+            except CircuitOpenError:
+                # Pause the job and release the leads rather than fail this one
+                raise
+            except Exception as e:
+                logger.error("Email repair pass failed: %s", e)
+                subject, body = None, None
+
+        if not subject or not body:
+            outcome = "failed"
+        record_parse_outcome(outcome)
+        return subject, body
+
+    def _run_stage(self, stage_name: str, task_variables: Dict[str, Any]) -> str:
+        """
+        Render a compiled task prompt and execute it with the configured stage runner
+        """
+        prompt = prompt_registry[stage_name]
+        description = prompt.render(task_variables)
+        with track_stage(stage_name):
+            return self.stage_runner(stage_name, description, prompt.expected_output)
+
+    @staticmethod
+    def _run_crew_stage(stage_name: str, description: str, expected_output: str) -> str:
+        """
+        Execute a single task through a one-task crewai Crew
+        """
+        agent_config = email_agents[task_agent_mapping[stage_name]]
+        agent = Agent(
+            role=agent_config["role"],
+            goal=agent_config["goal"],
+            backstory=agent_config["backstory"],
+            allow_delegation=agent_config.get("allow_delegation", False),
+            llm=agent_config["llm"]
+        )
+        task = Task(
+            description=description,
+            expected_output=expected_output,
+            agent=agent
+        )
+        crew = Crew(
+            agents=[agent],
+            tasks=[task],
+            verbose=is_verbose()
+        )
+        output = str(crew.kickoff())
+
+        # Token usage is accumulated on the crew after kickoff
+        usage = getattr(crew, "usage_metrics", None) or {}
+        if not isinstance(usage, dict):
+            usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+        record_usage(
+            stage_name,
+            getattr(agent_config["llm"], "model_name", None),
+            int(usage.get("prompt_tokens") or 0),
+            int(usage.get("completion_tokens") or 0)
+        )
+        return output
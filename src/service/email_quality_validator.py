@@ -0,0 +1,127 @@
+import os
+import re
+import random
+import logging
+import threading
+from typing import List, Optional
+
+from src.service.metrics_service import counters
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MAX_EMAIL_WORDS = 100
+# Fraction of locally-passing emails still sent to the LLM QC agent for audit
+QC_AUDIT_SAMPLE_RATE = float(os.getenv("QC_AUDIT_SAMPLE_RATE", "0.05"))
+# Fraction of the CTA's keywords that must appear in the body (the writer paraphrases it)
+QC_CTA_MIN_OVERLAP = float(os.getenv("QC_CTA_MIN_OVERLAP", "0.3"))
+
+SPAM_WORDS = [
+    "act now", "amazing deal", "buy now", "cash bonus", "click here", "congratulations",
+    "dear friend", "double your", "earn money", "exclusive deal", "free money", "guarantee",
+    "limited time", "no obligation", "once in a lifetime", "risk-free", "risk free",
+    "special promotion", "this isn't spam", "urgent", "winner", "100% free", "$$$",
+]
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "by", "can", "for", "from", "how", "in", "into", "is",
+    "it", "learn", "more", "of", "on", "or", "our", "that", "the", "this", "to", "us", "we",
+    "with", "you", "your", "about", "what", "will", "would", "could",
+}
+
+# Whole words/phrases only, so "free" doesn't match "freedom"
+_SPAM_RE = re.compile(r"(?<!\w)(?:" + "|".join(re.escape(word) for word in SPAM_WORDS) + r")(?!\w)")
+_URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+_WORD_RE = re.compile(r"[\w'-]+")
+# Leftover template slots such as [Name], {company}, <subject> or XXX
+_PLACEHOLDER_RE = re.compile(r"\[[^\]]*\]|\{[^}]*\}|<[^>]+>|\bX{3,}\b|lorem ipsum", re.IGNORECASE)
+
+
+def _keywords(text: str) -> List[str]:
+    return [
+        word for word in _WORD_RE.findall((text or "").lower())
+        if len(word) > 2 and word not in STOPWORDS
+    ]
+
+
+def validate_email(subject: Optional[str], body: Optional[str], cta: str, seller_name: str) -> List[str]:
+    """
+    Deterministic checks covering most of what the LLM QC agent looks at
+
+    Returns:
+        List[str]: Problems found, empty if the email passes
+    """
+    issues = []
+    if not subject or not body:
+        return ["missing subject or body"]
+
+    word_count = len(body.split())
+    if word_count >= MAX_EMAIL_WORDS:
+        issues.append(f"body has {word_count} words (limit {MAX_EMAIL_WORDS})")
+
+    body_lower = body.lower()
+    cta_urls = _URL_RE.findall(cta or "")
+    if cta_urls:
+        missing = [url for url in cta_urls if url.rstrip(".,)").lower() not in body_lower]
+        if missing:
+            issues.append("call to action link missing")
+    else:
+        cta_words = set(_keywords(cta))
+        if cta_words:
+            overlap = len(cta_words & set(_keywords(body))) / len(cta_words)
+            if overlap < QC_CTA_MIN_OVERLAP:
+                issues.append("call to action not found")
+
+    if seller_name:
+        closing = "\n".join(line for line in body.strip().splitlines()[-3:]).lower()
+        first_name = seller_name.split()[0].lower()
+        if seller_name.lower() not in closing and first_name not in closing:
+            issues.append("seller signature missing")
+
+    for text in (subject, body):
+        placeholder = _PLACEHOLDER_RE.search(text)
+        if placeholder:
+            issues.append(f"template placeholder left: {placeholder.group(0)}")
+            break
+
+    combined = f"{subject}\n{body}".lower()
+    spam = list(dict.fromkeys(_SPAM_RE.findall(combined)))
+    if spam:
+        issues.append(f"spam trigger words: {', '.join(spam)}")
+
+    return issues
+
+
+class EmailQualityGate:
+    """
+    Decides whether the LLM quality-control stage can be skipped: it only
+    runs when the local validator fails, or for a random audit sample
+    """
+
+    def __init__(self, audit_sample_rate: float = QC_AUDIT_SAMPLE_RATE, seed: Optional[int] = None):
+        self.audit_sample_rate = audit_sample_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.skipped = 0
+
+    @property
+    def skip_rate(self) -> float:
+        return self.skipped / self.checked if self.checked else 0.0
+
+    def needs_llm_review(self, subject: Optional[str], body: Optional[str], cta: str, seller_name: str) -> bool:
+        issues = validate_email(subject, body, cta, seller_name)
+        if issues:
+            outcome = "failed_local"
+            logger.info("Local QC flagged: %s", '; '.join(issues))
+        elif self._random.random() < self.audit_sample_rate:
+            outcome = "audit"
+        else:
+            outcome = "skipped"
+
+        with self._lock:
+            self.checked += 1
+            if outcome == "skipped":
+                self.skipped += 1
+        counters.inc("zylo_quality_control_total", help_text="LLM quality-control decisions", outcome=outcome)
+        return outcome != "skipped"
@@ -0,0 +1,76 @@
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Any
+
+from src.service.metrics_service import counters
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the coordinator's queue-depth limit is reached"""
+
+
+class GenerationCoordinator:
+    """
+    Runs generations on a bounded worker pool and coalesces duplicate
+    concurrent requests for the same key onto a single in-flight future
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue_depth: int = 20):
+        """
+        Args:
+            max_workers: Maximum number of generations running at once
+            max_queue_depth: Maximum number of accepted generations waiting for a worker
+        """
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def submit(self, key: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        Submit `fn` under `key`, or join the generation already running for it
+
+        Raises:
+            QueueFullError: If running plus queued generations exceed the limits
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                counters.inc("zylo_generation_requests_total", help_text="On-demand generation requests",
+                             outcome="coalesced")
+                logger.info("Coalescing request onto in-flight generation %s", key)
+                return future
+
+            if len(self._in_flight) >= self.max_workers + self.max_queue_depth:
+                counters.inc("zylo_generation_requests_total", help_text="On-demand generation requests",
+                             outcome="rejected")
+                raise QueueFullError(
+                    f"Generation queue is full ({len(self._in_flight)} in flight)"
+                )
+
+            future = self._executor.submit(fn, *args, **kwargs)
+            self._in_flight[key] = future
+            counters.inc("zylo_generation_requests_total", help_text="On-demand generation requests",
+                         outcome="started")
+
+        # Registered outside the lock: the callback runs immediately if already done
+        future.add_done_callback(lambda _: self._release(key, future))
+        return future
+
+    def _release(self, key: str, future: Future):
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,117 @@
+import io
+import os
+import csv
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional
+
+from sqlalchemy import select
+
+from src.db.session import SessionLocal
+from src.model.lead_email_details import LeadEmailDetails
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the server-side cursor per round trip
+LEAD_EXPORT_BATCH_SIZE = int(os.getenv("LEAD_EXPORT_BATCH_SIZE", "1000"))
+
+EXPORT_COLUMNS = (
+    "id",
+    "lead_name",
+    "linkedin_url",
+    "company_name",
+    "email_salutation",
+    "snapshot_id",
+    "generated_email_greeting",
+    "generated_email_hook",
+    "generated_email_body",
+    "updated_at",
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+class LeadExportService:
+    """
+    Streams generated emails ("done" leads) in id order through a server-side
+    cursor, so memory stays flat however large the campaign. Exports resume
+    from the last id received via `after_id`.
+    """
+
+    def __init__(self, session_factory=SessionLocal, batch_size: int = LEAD_EXPORT_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+
+    def iter_rows(self,
+                  snapshot_id: Optional[str] = None,
+                  since: Optional[datetime] = None,
+                  until: Optional[datetime] = None,
+                  after_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield exported rows as dicts
+
+        Args:
+            snapshot_id: Only leads from this snapshot
+            since: Only emails generated (last updated) at or after this time
+            until: Only emails generated before this time
+            after_id: Keyset cursor, only leads with a greater id
+        """
+        # Plain columns rather than ORM objects, so nothing accumulates in the identity map
+        stmt = (
+            select(*(getattr(LeadEmailDetails, column) for column in EXPORT_COLUMNS))
+            .where(LeadEmailDetails.status == "done")
+            .order_by(LeadEmailDetails.id)
+        )
+        if snapshot_id:
+            stmt = stmt.where(LeadEmailDetails.snapshot_id == snapshot_id)
+        if since:
+            stmt = stmt.where(LeadEmailDetails.updated_at >= since)
+        if until:
+            stmt = stmt.where(LeadEmailDetails.updated_at < until)
+        if after_id is not None:
+            stmt = stmt.where(LeadEmailDetails.id > after_id)
+
+        db = self.session_factory()
+        try:
+            # yield_per implies stream_results: a named cursor on Postgres
+            result = db.execute(stmt.execution_options(yield_per=self.batch_size))
+            exported = 0
+            for row in result:
+                exported += 1
+                yield dict(row._mapping)
+            logger.info("Exported %s generated emails", exported)
+        finally:
+            db.close()
+
+    def export(self, fmt: str = "csv", **filters) -> Iterator[str]:
+        """
+        Yield the export as text chunks in `fmt` ("csv" with a header row, or "ndjson")
+
+        Args:
+            fmt: One of `EXPORT_FORMATS`
+            **filters: Passed to `iter_rows`
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        if fmt == "ndjson":
+            for row in self.iter_rows(**filters):
+                yield json.dumps(row, default=str) + "\n"
+            return
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for row in self.iter_rows(**filters):
+            writer.writerow(row)
+            # Flush in batches rather than per row to keep the chunk count down
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
@@ -0,0 +1,163 @@
+import io
+import os
+import csv
+import logging
+import traceback
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.db.session import SessionLocal
+from src.model.lead_email_details import LeadEmailDetails
+from src.service.linkedin_client_service import LinkedInClientService
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Rows written per COPY / multi-row INSERT statement
+LEAD_INGEST_CHUNK_SIZE = int(os.getenv("LEAD_INGEST_CHUNK_SIZE", "1000"))
+
+# Columns a caller may set on an ingested lead
+INGEST_FIELDS = (
+    "lead_name",
+    "linkedin_url",
+    "company_name",
+    "product_desc",
+    "cta",
+    "email_salutation",
+    "snapshot_id",
+    "priority",
+    "tenant_key",
+    "seller_name",
+    "variant_count",
+)
+
+
+class LeadIngestionService:
+    """
+    Loads leads in bulk. Every lead's LinkedIn URL is checked against its
+    snapshot (each snapshot is read from S3 once per call) so bad rows are
+    rejected before they reach the generation queue.
+    """
+
+    def __init__(self,
+                 linkedin_service: Optional[LinkedInClientService] = None,
+                 session_factory=SessionLocal,
+                 chunk_size: int = LEAD_INGEST_CHUNK_SIZE):
+        """
+        Args:
+            linkedin_service: Optional LinkedIn client used to index snapshots
+            session_factory: Builds the database session used for the insert
+            chunk_size: Rows written per statement
+        """
+        self.linkedin_service = linkedin_service or LinkedInClientService()
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size
+
+    def validate(self, rows: Iterable[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Split rows into leads ready to insert and rejected rows
+
+        Returns:
+            Tuple: (accepted leads, rejections as {"row": index, "lead": row, "reason": str})
+        """
+        snapshot_urls: Dict[str, Optional[Set[str]]] = {}
+        accepted, rejected = [], []
+
+        for index, row in enumerate(rows):
+            lead = {
+                field: (row.get(field).strip() if isinstance(row.get(field), str) else row.get(field)) or None
+                for field in INGEST_FIELDS
+            }
+            reason = None
+
+            try:
+                lead["priority"] = int(lead["priority"] or 0)
+            except (TypeError, ValueError):
+                reason = f"invalid priority: {row.get('priority')!r}"
+            try:
+                lead["variant_count"] = int(lead["variant_count"] or 1)
+                if lead["variant_count"] < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                reason = reason or f"invalid variant_count: {row.get('variant_count')!r}"
+
+            snapshot_id = lead["snapshot_id"]
+            if reason is None and not snapshot_id:
+                reason = "missing snapshot_id"
+            elif reason is None:
+                if snapshot_id not in snapshot_urls:
+                    snapshot_urls[snapshot_id] = self.linkedin_service.get_snapshot_profile_urls(snapshot_id)
+                urls = snapshot_urls[snapshot_id]
+                if urls is None:
+                    reason = f"snapshot {snapshot_id} not found or unreadable"
+                elif lead["linkedin_url"] and lead["linkedin_url"] not in urls:
+                    reason = f"profile {lead['linkedin_url']} not in snapshot {snapshot_id}"
+                elif not lead["linkedin_url"] and not urls:
+                    reason = f"snapshot {snapshot_id} has no profiles"
+
+            if reason:
+                rejected.append({"row": index, "lead": row, "reason": reason})
+            else:
+                lead["status"] = "not_started"
+                accepted.append(lead)
+
+        logger.info("Validated %s leads against %s snapshots: %s accepted, %s rejected",
+                    len(accepted) + len(rejected), len(snapshot_urls), len(accepted), len(rejected))
+        return accepted, rejected
+
+    def ingest(self, rows: Iterable[Dict[str, Any]], dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Validate and insert leads
+
+        Args:
+            rows: Lead dicts keyed by `INGEST_FIELDS` (other keys are ignored)
+            dry_run: Validate only, insert nothing
+
+        Returns:
+            Dict: {"accepted": count, "inserted": count, "rejected": [...]}
+        """
+        accepted, rejected = self.validate(rows)
+        inserted = 0
+        if accepted and not dry_run:
+            db = self.session_factory()
+            try:
+                for start in range(0, len(accepted), self.chunk_size):
+                    self._insert(db, accepted[start:start + self.chunk_size])
+                db.commit()
+                inserted = len(accepted)
+            except Exception as e:
+                logger.error("Bulk lead insert failed: %s", e)
+                logger.error(traceback.format_exc())
+                db.rollback()
+                raise
+            finally:
+                db.close()
+        return {
+            "accepted": len(accepted),
+            "inserted": inserted,
+            "rejected": rejected
+        }
+
+    def _insert(self, db: Session, leads: List[Dict[str, Any]]):
+        columns = list(INGEST_FIELDS) + ["status"]
+        if db.get_bind().dialect.name == "postgresql":
+            # COPY is several times faster than INSERT for large loads
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for lead in leads:
+                # \N marks NULL in the COPY options below
+                writer.writerow(["\\N" if lead[column] is None else lead[column] for column in columns])
+            buffer.seek(0)
+            cursor = db.connection().connection.driver_connection.cursor()
+            try:
+                cursor.copy_expert(
+                    f"COPY {LeadEmailDetails.__tablename__} ({', '.join(columns)}) "
+                    "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                    buffer
+                )
+            finally:
+                cursor.close()
+        else:
+            db.execute(insert(LeadEmailDetails), leads)
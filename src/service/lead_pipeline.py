@@ -0,0 +1,310 @@
+import os
+import queue
+import logging
+import threading
+import traceback
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.db.session import SessionLocal
+from src.model.lead_email_details import LeadEmailDetails
+from src.service.email_generation_service import EmailGenerationService
+from src.service.lead_processing_service import (
+    generation_inputs,
+    mark_lead_error,
+    release_leads,
+    save_generation_result
+)
+from src.service.lead_scheduler import LEAD_CLAIM_HEARTBEAT_SECONDS, LeadScheduler, renew_claims
+from src.service.llm_resilience import CircuitOpenError
+from src.service.metrics_service import LeadMetrics, current_rss_kb, lead_metrics_context, peak_rss_kb, track_stage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How many leads the S3 fetch / profile build stage may run ahead of generation
+LEAD_PIPELINE_PREFETCH = int(os.getenv("LEAD_PIPELINE_PREFETCH", "2"))
+
+_DONE = object()
+
+
+class LeadPipeline:
+    """
+    Job runner split into three stages connected by bounded queues:
+
+    - prefetch (own thread): claims leads and fetches and parses their
+      profiles, up to `prefetch_depth` leads ahead
+    - generation (calling thread): runs the LLM stages, one lead at a time
+    - write-back (own thread): stores results and metrics
+
+    S3 and database I/O overlap with LLM waits; LLM concurrency is unchanged.
+    Prefetch and write-back open a fresh session per claim batch, and each
+    lead's objects are dropped once written, so memory stays flat over long
+    runs; RSS is logged after every batch. A heartbeat thread renews the
+    claim lease on every lead the run holds, so only leads of a dead worker
+    are ever reclaimed.
+    """
+
+    def __init__(self,
+                 email_service: EmailGenerationService,
+                 settle_delay_seconds: float,
+                 scheduler: Optional[LeadScheduler] = None,
+                 prefetch_depth: int = LEAD_PIPELINE_PREFETCH,
+                 stop_event: Optional[threading.Event] = None,
+                 session_factory=SessionLocal,
+                 heartbeat_seconds: float = LEAD_CLAIM_HEARTBEAT_SECONDS):
+        """
+        Args:
+            email_service: Service used for profile fetches and generation
+            settle_delay_seconds: Minimum age of a lead's last update before it is claimed
+            scheduler: Orders and claims leads, defaults to a `LeadScheduler`
+            prefetch_depth: Prepared leads allowed to wait for generation
+            stop_event: When set, the current lead finishes and every
+                claimed but unstarted lead is released
+            session_factory: Builds the per-stage database sessions
+            heartbeat_seconds: How often claims on held leads are renewed
+        """
+        self.email_service = email_service
+        self.settle_delay_seconds = settle_delay_seconds
+        self.scheduler = scheduler or LeadScheduler()
+        self.prefetch_depth = max(1, prefetch_depth)
+        self.stop_event = stop_event
+        self.session_factory = session_factory
+        self.heartbeat_seconds = heartbeat_seconds
+        self.processed = 0
+        # Claimed leads not yet written back or released
+        self._held: Set[int] = set()
+        self._held_lock = threading.Lock()
+        # Internal stop, set when the LLM circuit opens
+        self._halt = threading.Event()
+
+    def _stopping(self) -> bool:
+        return self._halt.is_set() or (self.stop_event is not None and self.stop_event.is_set())
+
+    def run(self) -> int:
+        """
+        Process settled leads until none are left or a stop is requested
+
+        Returns:
+            int: Number of leads generated
+
+        Raises:
+            CircuitOpenError: If the LLM circuit opened; unstarted leads have been released
+        """
+        prepared: queue.Queue = queue.Queue(maxsize=self.prefetch_depth)
+        results: queue.Queue = queue.Queue(maxsize=self.prefetch_depth)
+        prefetcher = threading.Thread(target=self._prefetch_loop, args=(prepared,), name="lead-prefetch", daemon=True)
+        writer = threading.Thread(target=self._write_back_loop, args=(results,), name="lead-write-back", daemon=True)
+        heartbeat_stop = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat_loop, args=(heartbeat_stop,),
+                                     name="lead-claim-heartbeat", daemon=True)
+        prefetcher.start()
+        writer.start()
+        heartbeat.start()
+
+        unstarted: List[int] = []
+        circuit_error: Optional[CircuitOpenError] = None
+        prefetch_done = False
+        try:
+            while True:
+                item = prepared.get()
+                if item is _DONE:
+                    prefetch_done = True
+                    break
+                if self._stopping():
+                    unstarted.append(item["lead_id"])
+                    continue
+                try:
+                    result = self._generate(item)
+                except CircuitOpenError as e:
+                    circuit_error = e
+                    self._halt.set()
+                    unstarted.append(item["lead_id"])
+                    continue
+                results.put((item["lead_id"], result))
+                self.processed += 1
+                # Don't hold the lead's profile and outputs while waiting for the next one
+                item = result = None
+        except BaseException:
+            # Let the prefetcher wind down, then hand back whatever it prepared
+            self._halt.set()
+            while not prefetch_done:
+                item = prepared.get()
+                if item is _DONE:
+                    prefetch_done = True
+                    break
+                unstarted.append(item["lead_id"])
+            raise
+        finally:
+            results.put(_DONE)
+            prefetcher.join()
+            writer.join()
+            if unstarted:
+                db = self.session_factory()
+                try:
+                    released = release_leads(db, unstarted)
+                    logger.info("Released %s claimed but unstarted leads", released)
+                finally:
+                    db.close()
+                    self._release_hold(unstarted)
+            heartbeat_stop.set()
+            heartbeat.join()
+
+        if circuit_error is not None:
+            raise circuit_error
+        return self.processed
+
+    def _prefetch_loop(self, prepared: queue.Queue):
+        try:
+            while not self._stopping() and self._prefetch_batch(prepared):
+                pass
+        finally:
+            prepared.put(_DONE)
+
+    def _prefetch_batch(self, prepared: queue.Queue) -> bool:
+        """
+        Claim one batch in a fresh session and hand its leads to the generation stage
+
+        Returns:
+            bool: False once there is nothing left to claim (or claiming failed)
+        """
+        db = self.session_factory()
+        # Claimed leads not yet handed to the generation stage
+        remaining: List[int] = []
+        try:
+            # Leads with status "not_started" that haven't been updated within the settle delay
+            settled_before = datetime.utcnow() - timedelta(seconds=self.settle_delay_seconds)
+            lead_ids = self.scheduler.claim_batch(db, settled_before)
+            if not lead_ids:
+                return False
+
+            logger.info("Claimed %s leads to process", len(lead_ids))
+            self._hold(lead_ids)
+            remaining = list(lead_ids)
+            while remaining and not self._stopping():
+                lead_id = remaining[0]
+                try:
+                    item = self._prepare(db, lead_id)
+                except Exception as e:
+                    # A bad row fails on its own; released, it would be claimed
+                    # first again and stop every run
+                    logger.error("Could not prepare lead %s: %s", lead_id, e)
+                    logger.error(traceback.format_exc())
+                    db.rollback()
+                    mark_lead_error(db, lead_id, f"Could not prepare lead: {e}")
+                    self._release_hold([lead_id])
+                    remaining.pop(0)
+                    continue
+                # Blocks while `prefetch_depth` leads are already waiting
+                prepared.put(item)
+                remaining.pop(0)
+            return True
+        except Exception as e:
+            logger.error("Lead prefetch failed: %s", e)
+            logger.error(traceback.format_exc())
+            db.rollback()
+            return False
+        finally:
+            try:
+                if remaining:
+                    release_leads(db, remaining)
+            except Exception as e:
+                logger.error("Could not release leads %s: %s", remaining, e)
+            finally:
+                db.close()
+                self._release_hold(remaining)
+
+    def _prepare(self, db, lead_id: int) -> Dict[str, Any]:
+        """Read a claimed lead and fetch its profile, timed into the lead's metrics"""
+        lead = db.get(LeadEmailDetails, lead_id)
+        inputs = generation_inputs(lead)
+        metrics = LeadMetrics()
+        with lead_metrics_context(metrics), track_stage("get_linkedin_profile"):
+            profile = self.email_service.linkedin_service.get_linkedin_profile(
+                inputs["snapshot_id"], inputs["linkedin_url"]
+            )
+        return {"lead_id": lead_id, "inputs": inputs, "profile": profile, "metrics": metrics}
+
+    def _generate(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        inputs = item["inputs"]
+        logger.info("Processing lead %s: %s", item["lead_id"], inputs["lead_name"])
+        if item["profile"] is None:
+            result = self.email_service.profile_not_found(inputs["snapshot_id"], inputs["lead_name"])
+            result["metrics"] = item["metrics"]
+            return result
+        try:
+            return self.email_service.generate_email(**inputs, profile=item["profile"], metrics=item["metrics"])
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            return {"status": "error", "message": str(e), "metrics": item["metrics"]}
+
+    def _write_back_loop(self, results: queue.Queue):
+        batch_size = self.scheduler.batch_size
+        db = self.session_factory()
+        written = 0
+        try:
+            while True:
+                entry = results.get()
+                if entry is _DONE:
+                    break
+                lead_id, result = entry
+                try:
+                    save_generation_result(db, db.get(LeadEmailDetails, lead_id), result)
+                except Exception as e:
+                    logger.error("Write-back failed for lead %s: %s", lead_id, e)
+                    db.rollback()
+                    self._mark_error(lead_id, f"Could not store generation result: {e}")
+                self._release_hold([lead_id])
+                entry = result = None
+                written += 1
+
+                if written % batch_size == 0:
+                    # Start each batch with an empty identity map
+                    db.close()
+                    db = self.session_factory()
+                    self._log_batch_memory(written)
+        finally:
+            db.close()
+            if written % batch_size:
+                self._log_batch_memory(written)
+
+    def _mark_error(self, lead_id: int, message: str):
+        """Fail a lead in a fresh session, so it doesn't stay "in_progress" after a broken write"""
+        db = self.session_factory()
+        try:
+            mark_lead_error(db, lead_id, message)
+        except Exception as e:
+            logger.error("Could not mark lead %s as failed: %s", lead_id, e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def _hold(self, lead_ids: Iterable[int]):
+        with self._held_lock:
+            self._held.update(lead_ids)
+
+    def _release_hold(self, lead_ids: Iterable[int]):
+        with self._held_lock:
+            self._held.difference_update(lead_ids)
+
+    def _heartbeat_loop(self, stop: threading.Event):
+        while not stop.wait(self.heartbeat_seconds):
+            with self._held_lock:
+                held = list(self._held)
+            if not held:
+                continue
+            db = self.session_factory()
+            try:
+                renew_claims(db, held)
+            except Exception as e:
+                # The lease outlasts several missed beats
+                logger.error("Could not renew lead claims: %s", e)
+                db.rollback()
+            finally:
+                db.close()
+
+    @staticmethod
+    def _log_batch_memory(written: int):
+        logger.info("Wrote %s leads; RSS %s KB, peak %s KB", written, current_rss_kb(), peak_rss_kb())
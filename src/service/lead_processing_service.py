@@ -0,0 +1,284 @@
+import logging
+import traceback
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from src.model.lead_email_details import LeadEmailDetails
+from src.model.lead_email_variant import LeadEmailVariant
+from src.service.email_generation_service import EmailGenerationService
+from src.service.lead_scheduler import lease_cutoff, lease_expired
+from src.service.llm_resilience import CircuitOpenError
+from src.service.metrics_service import LeadMetrics, MetricsService
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default offer and CTA text
+DEFAULT_OFFER = "We provide top-tier corporate training services designed to enhance team productivity and skill development through customized workshops and ongoing support."
+DEFAULT_CTA = "Reply to this email or schedule a 15-minute call to learn how we can tailor our training to your team's specific needs."
+DEFAULT_SELLER_NAME = "John Doe"
+
+# Generation inputs a regeneration may change, and the lead column holding each
+REGENERATION_INPUT_COLUMNS = {
+    "offer": "product_desc",
+    "cta": "cta",
+    "seller_name": "seller_name",
+}
+
+# Lead columns holding each reusable stage output and the key of the inputs it came from
+STAGE_OUTPUT_COLUMNS = {
+    "profile_analysis_task": ("profile_analysis_result", "profile_analysis_key"),
+    "company_analysis_task": ("company_analysis_result", "company_analysis_key"),
+}
+
+
+class LeadNotFoundError(Exception):
+    """Raised when a lead id does not exist"""
+
+
+class LeadBusyError(Exception):
+    """Raised when a lead is already being processed elsewhere"""
+
+
+def claim_lead(db: Session, lead_id: int, from_statuses: Iterable[str] = ("not_started",)) -> bool:
+    """
+    Atomically move a lead to "in_progress" if it is in one of `from_statuses`
+    or its previous claim expired
+
+    Returns:
+        bool: True if this caller now owns the lead
+    """
+    updated = (
+        db.query(LeadEmailDetails)
+        .filter(
+            LeadEmailDetails.id == lead_id,
+            or_(LeadEmailDetails.status.in_(list(from_statuses)), lease_expired(lease_cutoff()))
+        )
+        .update({"status": "in_progress", "claimed_at": datetime.utcnow()}, synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+def mark_lead_error(db: Session, lead_id: int, message: str) -> bool:
+    """
+    Set a claimed lead to "error" in its own transaction, for failures
+    outside generation (unreadable row, failed write-back)
+
+    Returns:
+        bool: True if the lead was updated
+    """
+    updated = (
+        db.query(LeadEmailDetails)
+        .filter(LeadEmailDetails.id == lead_id, LeadEmailDetails.status == "in_progress")
+        .update({"status": "error", "error_message": message}, synchronize_session=False)
+    )
+    db.commit()
+    return updated == 1
+
+
+def release_leads(db: Session, lead_ids: Iterable[int]) -> int:
+    """
+    Hand claimed leads that were never started back to the queue
+
+    Returns:
+        int: Number of leads moved from "in_progress" back to "not_started"
+    """
+    lead_ids = list(lead_ids)
+    if not lead_ids:
+        return 0
+    released = (
+        db.query(LeadEmailDetails)
+        .filter(
+            LeadEmailDetails.id.in_(lead_ids),
+            LeadEmailDetails.status == "in_progress"
+        )
+        .update({"status": "not_started", "claimed_at": None}, synchronize_session=False)
+    )
+    db.commit()
+    return released
+
+
+def generation_inputs(lead: LeadEmailDetails) -> Dict[str, Any]:
+    """Keyword arguments for `EmailGenerationService.generate_email` from a lead row"""
+    return {
+        "snapshot_id": lead.snapshot_id,
+        "lead_name": lead.lead_name,
+        "linkedin_url": lead.linkedin_url,
+        # Use default values if not provided
+        "offer": lead.product_desc or DEFAULT_OFFER,
+        "cta": lead.cta or DEFAULT_CTA,
+        "seller_name": lead.seller_name or DEFAULT_SELLER_NAME,
+        "stage_outputs": stored_stage_outputs(lead),
+        "variant_count": lead.variant_count or 1
+    }
+
+
+def stored_stage_outputs(lead: LeadEmailDetails) -> Dict[str, Dict[str, str]]:
+    """Stage outputs saved on the lead by its previous generation"""
+    return {
+        stage_name: {"key": getattr(lead, key_column), "result": getattr(lead, result_column)}
+        for stage_name, (result_column, key_column) in STAGE_OUTPUT_COLUMNS.items()
+        if getattr(lead, result_column)
+    }
+
+
+def apply_regeneration_inputs(lead: LeadEmailDetails, changes: Dict[str, Optional[str]]) -> bool:
+    """
+    Set changed generation inputs (offer, cta, seller_name) on a lead
+
+    Returns:
+        bool: True if any input changed
+    """
+    changed = False
+    for field, column in REGENERATION_INPUT_COLUMNS.items():
+        value = changes.get(field)
+        if value is not None and value != getattr(lead, column):
+            setattr(lead, column, value)
+            changed = True
+    return changed
+
+
+def requeue_leads(db: Session, snapshot_id: str, changes: Dict[str, Optional[str]]) -> int:
+    """
+    Apply changed inputs to a snapshot's finished (or failed) leads and put
+    them back in the queue; workers then rerun only the stages whose inputs
+    changed
+
+    Returns:
+        int: Number of leads requeued
+    """
+    values = {
+        column: changes[field]
+        for field, column in REGENERATION_INPUT_COLUMNS.items()
+        if changes.get(field) is not None
+    }
+    values["status"] = "not_started"
+    values["error_message"] = None
+    requeued = (
+        db.query(LeadEmailDetails)
+        .filter(
+            LeadEmailDetails.snapshot_id == snapshot_id,
+            LeadEmailDetails.status.in_(["done", "error"])
+        )
+        .update(values, synchronize_session=False)
+    )
+    db.commit()
+    logger.info("Requeued %s leads of snapshot %s for regeneration", requeued, snapshot_id)
+    return requeued
+
+
+def process_lead(db: Session,
+                 lead: LeadEmailDetails,
+                 email_service: EmailGenerationService,
+                 refresh: bool = False) -> Dict[str, Any]:
+    """
+    Generate the email for a lead that the caller has already claimed and
+    write the result (or error) back to the lead row
+
+    Args:
+        refresh: Bypass the result cache, e.g. for a forced regeneration
+
+    Returns:
+        Dict: The generation result from `EmailGenerationService.generate_email`
+
+    Raises:
+        CircuitOpenError: If the LLM circuit is open; the lead is released
+            back to "not_started" first
+    """
+    try:
+        logger.info("Processing lead %s: %s", lead.id, lead.lead_name)
+        result = email_service.generate_email(**generation_inputs(lead), refresh=refresh)
+    except CircuitOpenError:
+        db.rollback()
+        release_leads(db, [lead.id])
+        raise
+    except Exception as e:
+        logger.error(traceback.format_exc())
+        result = {
+            "status": "error",
+            "message": str(e)
+        }
+    return save_generation_result(db, lead, result)
+
+
+def _replace_variants(db: Session, lead_id: int, variants: List[Dict[str, str]]):
+    """Replace a lead's stored A/B variants (uncommitted)"""
+    db.query(LeadEmailVariant).filter(LeadEmailVariant.lead_id == lead_id).delete(synchronize_session=False)
+    db.add_all([
+        LeadEmailVariant(lead_id=lead_id, variant_index=index, subject=variant["subject"], body=variant["body"])
+        for index, variant in enumerate(variants)
+    ])
+
+
+def _persist_metrics(db: Session, lead_id: int, metrics: LeadMetrics):
+    """Store a lead's stage metrics; a failure is logged and never changes the lead's outcome"""
+    try:
+        MetricsService.persist(db, lead_id, metrics)
+    except Exception as e:
+        logger.error("Failed to persist metrics for lead %s: %s", lead_id, e)
+        db.rollback()
+
+
+def save_generation_result(db: Session, lead: LeadEmailDetails, result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Write a generation result (or error) back to the lead row and persist its stage metrics
+
+    Returns:
+        Dict: `result`, or an error result if it couldn't be stored
+    """
+    try:
+        metrics = result.get("metrics") or LeadMetrics()
+
+        # Keep analysis outputs even when the email itself failed, so a retry can reuse them
+        for stage_name, stored in (result.get("stage_outputs") or {}).items():
+            result_column, key_column = STAGE_OUTPUT_COLUMNS[stage_name]
+            setattr(lead, result_column, stored["result"])
+            setattr(lead, key_column, stored["key"])
+
+        if result.get("status") == "error":
+            logger.error("Error generating email for lead %s: %s", lead.id, result.get('message'))
+            # Variants from an earlier generation must not show next to the error
+            _replace_variants(db, lead.id, [])
+            lead.status = "error"
+            lead.error_message = result.get("message", "Unknown error")
+            with metrics.stage("write_back"):
+                db.commit()
+            _persist_metrics(db, lead.id, metrics)
+            return result
+
+        # Update lead with generated email
+        lead.generated_email_greeting = f"Hello {lead.lead_name}"
+        lead.generated_email_hook = result.get("subject", "")
+        lead.generated_email_body = result.get("body", "")
+
+        # Validate email body
+        if not lead.generated_email_body:
+            raise ValueError("Generated email body is empty")
+
+        # The first variant is also the main email above
+        _replace_variants(db, lead.id, result.get("variants") or [])
+
+        lead.status = "done"
+        lead.error_message = None
+        with metrics.stage("write_back"):
+            db.commit()
+        _persist_metrics(db, lead.id, metrics)
+        logger.info("Successfully processed lead %s: %s", lead.id, lead.lead_name)
+        return result
+
+    except Exception as e:
+        logger.error("Error processing lead %s: %s", lead.id, e)
+        logger.error(traceback.format_exc())
+        db.rollback()
+        _replace_variants(db, lead.id, [])
+        lead.status = "error"
+        lead.error_message = str(e)
+        db.commit()
+        return {
+            "status": "error",
+            "message": str(e)
+        }
@@ -0,0 +1,265 @@
+import os
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, func, literal_column, or_, select, true, tuple_, update
+from sqlalchemy.orm import Session
+
+from src.model.lead_email_details import LeadEmailDetails
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Number of leads claimed per scheduling round; fairness is re-evaluated every round
+LEAD_CLAIM_BATCH_SIZE = int(os.getenv("LEAD_CLAIM_BATCH_SIZE", "10"))
+# JSON object mapping a share key (tenant_key, else snapshot_id, else company_name) to its weight
+FAIR_SHARE_WEIGHTS = json.loads(os.getenv("FAIR_SHARE_WEIGHTS", "{}") or "{}")
+FAIR_SHARE_DEFAULT_WEIGHT = float(os.getenv("FAIR_SHARE_DEFAULT_WEIGHT", "1"))
+# An "in_progress" claim not renewed for this long belongs to a worker that was
+# killed or crashed, and the lead can be claimed again. Job runs and API
+# generations both renew their claims on a heartbeat, so the lease only has to
+# outlast a few missed beats, not the longest generation.
+LEAD_CLAIM_LEASE_SECONDS = float(os.getenv("LEAD_CLAIM_LEASE_SECONDS", "900"))
+# How often a claim holder renews the claims on the leads it holds
+LEAD_CLAIM_HEARTBEAT_SECONDS = float(os.getenv("LEAD_CLAIM_HEARTBEAT_SECONDS", str(LEAD_CLAIM_LEASE_SECONDS / 3)))
+
+
+def share_key_expression():
+    """SQL expression grouping leads for fair sharing"""
+    return func.coalesce(
+        LeadEmailDetails.tenant_key,
+        LeadEmailDetails.snapshot_id,
+        LeadEmailDetails.company_name,
+        # A literal, not a bind parameter, so Postgres matches the expression index
+        literal_column("''")
+    )
+
+
+def lease_cutoff(lease_seconds: float = LEAD_CLAIM_LEASE_SECONDS) -> datetime:
+    """Claims made or renewed before this have expired"""
+    return datetime.utcnow() - timedelta(seconds=lease_seconds)
+
+
+def lease_expired(cutoff: datetime):
+    """SQL condition: the lead is claimed but its lease ran out (or predates leases)"""
+    return and_(
+        LeadEmailDetails.status == "in_progress",
+        or_(LeadEmailDetails.claimed_at.is_(None), LeadEmailDetails.claimed_at < cutoff)
+    )
+
+
+def renew_claims(db: Session, lead_ids: Iterable[int]) -> int:
+    """
+    Extend the lease on leads this process still holds
+
+    Returns:
+        int: Number of leads renewed
+    """
+    lead_ids = list(lead_ids)
+    if not lead_ids:
+        return 0
+    renewed = db.execute(
+        update(LeadEmailDetails)
+        .where(LeadEmailDetails.id.in_(lead_ids), LeadEmailDetails.status == "in_progress")
+        .values(claimed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return renewed
+
+
+@contextmanager
+def claim_heartbeat(session_factory, lead_ids: Iterable[int],
+                    interval_seconds: float = LEAD_CLAIM_HEARTBEAT_SECONDS):
+    """Renew the claims on `lead_ids` every `interval_seconds` while the block runs"""
+    lead_ids = list(lead_ids)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval_seconds):
+            db = session_factory()
+            try:
+                renew_claims(db, lead_ids)
+            except Exception as e:
+                # The lease outlasts several missed beats
+                logger.error("Could not renew claims on leads %s: %s", lead_ids, e)
+                db.rollback()
+            finally:
+                db.close()
+
+    thread = threading.Thread(target=beat, name="lead-claim-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+class LeadScheduler:
+    """
+    Claims eligible leads in priority order, interleaving leads from
+    different share keys by weighted round robin so one large upload
+    can't starve smaller ones
+    """
+
+    def __init__(self,
+                 batch_size: int = LEAD_CLAIM_BATCH_SIZE,
+                 weights: Optional[Dict[str, float]] = None,
+                 default_weight: float = FAIR_SHARE_DEFAULT_WEIGHT,
+                 lease_seconds: float = LEAD_CLAIM_LEASE_SECONDS):
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.weights = FAIR_SHARE_WEIGHTS if weights is None else weights
+        self.default_weight = default_weight
+
+    def weight(self, share_key: str) -> float:
+        return max(float(self.weights.get(share_key, self.default_weight)), 1e-6)
+
+    @staticmethod
+    def eligible(settled_before: datetime):
+        """Conditions a lead must meet to be claimed"""
+        return (
+            LeadEmailDetails.status == "not_started",
+            LeadEmailDetails.updated_at <= settled_before
+        )
+
+    def next_candidates(self, db: Session, settled_before: datetime, limit: int) -> List[int]:
+        """
+        Pick up to `limit` eligible lead ids in scheduling order without claiming them
+
+        No (priority, share key) group can contribute more than `limit` leads
+        to one round, so only the first `limit` leads of each group are read.
+        On Postgres the groups are found by a loose index scan over
+        ix_lead_email_details_claim_order and each group's head by a LATERAL
+        index scan, so a claim costs a few index probes per group rather than
+        a read of the whole backlog; other databases rank the whole backlog
+        with a window function.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            rows = self._group_heads_lateral(db, settled_before, limit)
+        else:
+            rows = self._group_heads_window(db, settled_before, limit)
+
+        # Rank within each group by id
+        share_rank: Dict[tuple, int] = {}
+        ranked = []
+        for lead_id, priority, share_key in sorted(rows, key=lambda row: row[0]):
+            group = (priority, share_key)
+            share_rank[group] = share_rank.get(group, 0) + 1
+            ranked.append((lead_id, priority, share_key, share_rank[group]))
+
+        # Highest priority first, then weighted round robin: the n-th lead of a
+        # key with weight w is due at virtual time n / w
+        ranked.sort(key=lambda row: (-row[1], row[3] / self.weight(row[2]), row[0]))
+        return [row[0] for row in ranked[:limit]]
+
+    def _group_heads_lateral(self, db: Session, settled_before: datetime, limit: int) -> List[tuple]:
+        share_key = share_key_expression()
+        group_columns = (LeadEmailDetails.priority.label("priority"), share_key.label("share_key"))
+
+        # Loose index scan: Postgres has no skip scan, so walk the distinct
+        # groups of ix_lead_email_details_claim_order one index probe at a time
+        first_group = (
+            select(*group_columns)
+            .where(LeadEmailDetails.status == "not_started")
+            .order_by(LeadEmailDetails.priority, share_key)
+            .limit(1)
+        )
+        groups = first_group.cte("share_groups", recursive=True)
+        next_group = (
+            select(*group_columns)
+            .where(
+                LeadEmailDetails.status == "not_started",
+                tuple_(LeadEmailDetails.priority, share_key) > tuple_(groups.c.priority, groups.c.share_key)
+            )
+            .order_by(LeadEmailDetails.priority, share_key)
+            .limit(1)
+            .lateral("next_group")
+        )
+        groups = groups.union_all(
+            select(next_group.c.priority, next_group.c.share_key).select_from(groups.join(next_group, true()))
+        )
+
+        heads = (
+            select(LeadEmailDetails.id.label("id"))
+            .where(
+                *self.eligible(settled_before),
+                LeadEmailDetails.priority == groups.c.priority,
+                share_key == groups.c.share_key
+            )
+            .order_by(LeadEmailDetails.id)
+            .limit(limit)
+            .lateral("share_heads")
+        )
+        return [
+            tuple(row) for row in db.execute(
+                select(heads.c.id, groups.c.priority, groups.c.share_key)
+                .select_from(groups.join(heads, true()))
+            )
+        ]
+
+    def _group_heads_window(self, db: Session, settled_before: datetime, limit: int) -> List[tuple]:
+        share_key = share_key_expression()
+        share_rank = func.row_number().over(
+            partition_by=(LeadEmailDetails.priority, share_key),
+            order_by=LeadEmailDetails.id
+        )
+        ranked = (
+            select(
+                LeadEmailDetails.id.label("id"),
+                LeadEmailDetails.priority.label("priority"),
+                share_key.label("share_key"),
+                share_rank.label("share_rank")
+            )
+            .where(*self.eligible(settled_before))
+            .subquery()
+        )
+        return [
+            tuple(row) for row in db.execute(
+                select(ranked.c.id, ranked.c.priority, ranked.c.share_key)
+                .where(ranked.c.share_rank <= limit)
+            )
+        ]
+
+    def claim_batch(self, db: Session, settled_before: datetime, limit: Optional[int] = None) -> List[int]:
+        """
+        Atomically move the next batch of leads to "in_progress", starting a
+        lease on each. Leads whose lease expired are reclaimed first.
+
+        Returns:
+            List[int]: Claimed lead ids in the order they should be processed
+        """
+        limit = limit or self.batch_size
+        cutoff = lease_cutoff(self.lease_seconds)
+        abandoned = list(db.execute(
+            select(LeadEmailDetails.id)
+            .where(lease_expired(cutoff))
+            .order_by(LeadEmailDetails.id)
+            .limit(limit)
+        ).scalars())
+        if abandoned:
+            logger.warning("Reclaiming %s leads whose claim expired: %s", len(abandoned), abandoned)
+        candidates = abandoned
+        if len(abandoned) < limit:
+            candidates = abandoned + self.next_candidates(db, settled_before, limit - len(abandoned))
+        if not candidates:
+            return []
+
+        # Leads taken by another worker in the meantime fail the status check
+        claimed = set(db.execute(
+            update(LeadEmailDetails)
+            .where(
+                LeadEmailDetails.id.in_(candidates),
+                or_(LeadEmailDetails.status == "not_started", lease_expired(cutoff))
+            )
+            .values(status="in_progress", claimed_at=datetime.utcnow())
+            .returning(LeadEmailDetails.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all())
+        db.commit()
+        return [lead_id for lead_id in candidates if lead_id in claimed]
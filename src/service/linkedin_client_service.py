@@ -2,11 +2,12 @@ import os
 import json
 import boto3
 import logging
-from typing import Optional, Dict, Any, List, Union
+from typing import Optional, Dict, Any, List, Set, Union
 from fastapi import HTTPException
 import traceback
 
 from src.model.linkedin_profile import LinkedInProfile
+from src.service.metrics_service import track_stage
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,8 +15,13 @@ logger = logging.getLogger(__name__)
 class LinkedInClientService:
     """Service for retrieving LinkedIn profile data from S3"""
     
-    def __init__(self):
-        """Initialize the LinkedIn client service"""
+    def __init__(self, s3_client: Optional[Any] = None):
+        """
+        Initialize the LinkedIn client service
+
+        Args:
+            s3_client: Optional pre-built S3 client (used by the benchmark's fake S3)
+        """
         self.s3_bucket = os.getenv('S3_BUCKET')
         self.aws_access_key = os.getenv('AWS_ACCESS_KEY')
         self.aws_secret_key = os.getenv('AWS_SECRET_KEY')
@@ -26,7 +32,7 @@ class LinkedInClientService:
             raise ValueError("Missing required S3 environment variables")
         
         # Initialize S3 client
-        self.s3_client = boto3.client(
+        self.s3_client = s3_client or boto3.client(
             's3',
             aws_access_key_id=self.aws_access_key,
             aws_secret_access_key=self.aws_secret_key
@@ -45,17 +51,20 @@ class LinkedInClientService:
         """
         try:
             file_key = f'public/{snapshot_id}.json'
-            logger.info(f"Attempting to access S3 key: {file_key} in bucket: {self.s3_bucket}")
+            logger.info("Attempting to access S3 key: %s in bucket: %s", file_key, self.s3_bucket)
             
             try:
-                response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=file_key)
-                content = response['Body'].read().decode('utf-8')
-                logger.info(f"Successfully read {len(content)} bytes from S3")
-                logger.debug(f"Raw S3 content: {content}")  # Log full content for debugging
+                with track_stage("s3_fetch"):
+                    response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=file_key)
+                    content = response['Body'].read().decode('utf-8')
+                logger.info("Successfully read %s bytes from S3", len(content))
+                logger.debug("Raw S3 content: %s", content)  # Log full content for debugging
                 
                 # Parse JSON content
-                data = json.loads(content)
-                logger.debug(f"Parsed JSON data: {json.dumps(data, indent=2)}")
+                with track_stage("json_parse"):
+                    data = json.loads(content)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Parsed JSON data: %s", json.dumps(data, indent=2))
                 
                 if data is None:
                     logger.error("S3 file contains null data")
@@ -63,34 +72,36 @@ class LinkedInClientService:
                 
                 # Handle both list and single object formats
                 profiles = data if isinstance(data, list) else [data]
-                logger.info(f"Found {len(profiles)} profiles in data")
+                logger.info("Found %s profiles in data", len(profiles))
                 
                 # If URL is provided, find matching profile
                 if linkedin_url:
-                    logger.info(f"Looking for profile with URL: {linkedin_url}")
+                    logger.info("Looking for profile with URL: %s", linkedin_url)
                     for profile in profiles:
                         if profile.get('url') == linkedin_url:
                             logger.info("Found matching profile by URL")
-                            return LinkedInProfile.from_s3_data(profile)
+                            with track_stage("from_s3_data"):
+                                return LinkedInProfile.from_s3_data(profile)
                     
-                    logger.warning(f"No profile found with URL {linkedin_url}")
+                    logger.warning("No profile found with URL %s", linkedin_url)
                     return None
                 
                 # If no URL provided and multiple profiles exist, use the first one
                 if profiles:
                     logger.info("Using first profile from data")
-                    return LinkedInProfile.from_s3_data(profiles[0])
+                    with track_stage("from_s3_data"):
+                        return LinkedInProfile.from_s3_data(profiles[0])
                 
                 logger.warning("No profiles found in data")
                 return None
                 
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON from S3: {str(e)}")
-                logger.error(f"Raw content causing error: {content}")
+                logger.error("Failed to parse JSON from S3: %s", e)
+                logger.error("Raw content causing error: %s", content)
                 return None
                 
         except Exception as e:
-            logger.error(f"Error retrieving LinkedIn profile: {str(e)}")
+            logger.error("Error retrieving LinkedIn profile: %s", e)
             logger.error(traceback.format_exc())
             return None
     
@@ -107,12 +118,12 @@ class LinkedInClientService:
         try:
             # Construct the S3 key
             file_key = f'public/{snapshot_id}.json'
-            logger.info(f"Reading from S3 bucket: {self.s3_bucket}, key: {file_key}")
+            logger.info("Reading from S3 bucket: %s, key: %s", self.s3_bucket, file_key)
             
             # Get the object from S3
             response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=file_key)
             content = response['Body'].read().decode('utf-8')
-            logger.info(f"Successfully read {len(content)} bytes from S3")
+            logger.info("Successfully read %s bytes from S3", len(content))
             
             # Parse JSON content
             data = json.loads(content)
@@ -127,5 +138,28 @@ class LinkedInClientService:
             return [LinkedInProfile.from_s3_data(profile) for profile in profiles]
             
         except Exception as e:
-            logger.error(f"Error retrieving LinkedIn profiles: {str(e)}")
-            raise
\ No newline at end of file
+            logger.error("Error retrieving LinkedIn profiles: %s", e)
+            raise
+
+    def get_snapshot_profile_urls(self, snapshot_id: str) -> Optional[Set[str]]:
+        """
+        Profile URLs contained in a snapshot, used to validate leads before they are queued
+        
+        Args:
+            snapshot_id: The ID of the snapshot in S3
+            
+        Returns:
+            Set[str]: URLs of every profile in the snapshot (may be empty),
+            or None if the snapshot is missing or unreadable
+        """
+        try:
+            file_key = f'public/{snapshot_id}.json'
+            response = self.s3_client.get_object(Bucket=self.s3_bucket, Key=file_key)
+            data = json.loads(response['Body'].read().decode('utf-8'))
+            if data is None:
+                return set()
+            profiles = data if isinstance(data, list) else [data]
+            return {profile.get('url') for profile in profiles if isinstance(profile, dict) and profile.get('url')}
+        except Exception as e:
+            logger.error("Error indexing snapshot %s: %s", snapshot_id, e)
+            return None
@@ -0,0 +1,257 @@
+import os
+import json
+import math
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from src.service.metrics_service import LeadMetrics, counters, lead_metrics_context, record_usage
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+LLM_RESILIENCE_ENABLED = os.getenv("LLM_RESILIENCE_ENABLED", "true").lower() == "true"
+# Hard ceiling on one stage, hedge included
+LLM_STAGE_DEADLINE_SECONDS = float(os.getenv("LLM_STAGE_DEADLINE_SECONDS", "180"))
+# Per-stage overrides, e.g. {"email_creation_task": 120}
+LLM_STAGE_DEADLINES = json.loads(os.getenv("LLM_STAGE_DEADLINES", "{}"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+# Hedge after the stage's observed p95, but never sooner than this
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "5"))
+# Hedge delay used until a stage has enough samples for a p95
+LLM_HEDGE_DEFAULT_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "60"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_MAX_THREADS = int(os.getenv("LLM_MAX_THREADS", "8"))
+# Circuit breaker: open when this fraction of calls in the window fail
+LLM_CIRCUIT_FAILURE_RATE = float(os.getenv("LLM_CIRCUIT_FAILURE_RATE", "0.5"))
+LLM_CIRCUIT_MIN_CALLS = int(os.getenv("LLM_CIRCUIT_MIN_CALLS", "10"))
+LLM_CIRCUIT_WINDOW_SECONDS = float(os.getenv("LLM_CIRCUIT_WINDOW_SECONDS", "60"))
+LLM_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+
+class StageTimeoutError(Exception):
+    """Raised when an LLM stage (including its hedge) misses its deadline"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the circuit breaker is open"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies per stage"""
+
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage_name: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage_name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, stage_name: str, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(stage_name, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+    def count(self, stage_name: str) -> int:
+        with self._lock:
+            return len(self._samples.get(stage_name, ()))
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when the failure rate over a sliding window crosses the
+    threshold; after the cooldown one probe call is let through (half-open)
+    and its outcome closes or re-opens the circuit
+    """
+
+    def __init__(self,
+                 failure_rate: float = LLM_CIRCUIT_FAILURE_RATE,
+                 min_calls: int = LLM_CIRCUIT_MIN_CALLS,
+                 window_seconds: float = LLM_CIRCUIT_WINDOW_SECONDS,
+                 cooldown_seconds: float = LLM_CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.cooldown_seconds = cooldown_seconds
+        self._calls: Deque = deque()
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._probing or time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._opened_at is None:
+                return 0.0
+            return max(0.0, self.cooldown_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._probing or time.monotonic() - self._opened_at < self.cooldown_seconds:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, success: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                if self._probing:
+                    self._probing = False
+                    if success:
+                        logger.info("LLM circuit closed after successful probe")
+                        self._opened_at = None
+                        self._calls.clear()
+                    else:
+                        self._opened_at = now
+                return
+
+            self._calls.append((now, success))
+            while self._calls and now - self._calls[0][0] > self.window_seconds:
+                self._calls.popleft()
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if len(self._calls) >= self.min_calls and failures / len(self._calls) >= self.failure_rate:
+                logger.error("LLM circuit opened: %s of %s calls failed in %ss",
+                             failures, len(self._calls), self.window_seconds)
+                counters.inc("zylo_llm_circuit_open_total", help_text="Times the LLM circuit breaker opened")
+                self._opened_at = now
+
+
+class ResilientStageRunner:
+    """
+    Wraps a stage runner with a per-stage deadline, a hedged second attempt
+    once the first has run longer than the stage's p95, and a circuit breaker.
+    The first attempt to succeed wins; the loser is left to finish in the
+    background (the HTTP client timeout bounds how long it can hold a thread).
+    A loser still running is charged the winner's token usage when the stage
+    returns, since anything it records later would land after write-back.
+    """
+
+    def __init__(self,
+                 runner: Callable[[str, str, str], str],
+                 deadlines: Optional[Dict[str, float]] = None,
+                 default_deadline: float = LLM_STAGE_DEADLINE_SECONDS,
+                 hedge_enabled: bool = LLM_HEDGE_ENABLED,
+                 max_threads: int = LLM_MAX_THREADS,
+                 tracker: Optional[LatencyTracker] = None,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.runner = runner
+        self.deadlines = deadlines if deadlines is not None else LLM_STAGE_DEADLINES
+        self.default_deadline = default_deadline
+        self.hedge_enabled = hedge_enabled
+        self.tracker = tracker or LatencyTracker()
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="llm")
+
+    def hedge_delay(self, stage_name: str) -> float:
+        if self.tracker.count(stage_name) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY_SECONDS
+        return max(LLM_HEDGE_MIN_DELAY_SECONDS, self.tracker.percentile(stage_name, 95))
+
+    def _submit(self, stage_name: str, description: str, expected_output: str) -> Tuple[Future, LeadMetrics]:
+        # Each attempt runs in a copy of the caller's context but collects its
+        # token usage apart; `_charge_usage` moves it to the lead's metrics
+        usage = LeadMetrics()
+        context = contextvars.copy_context()
+        future = self._executor.submit(context.run, self._run_attempt, usage, stage_name, description, expected_output)
+        return future, usage
+
+    def _run_attempt(self, usage: LeadMetrics, stage_name: str, description: str, expected_output: str) -> str:
+        with lead_metrics_context(usage):
+            return self.runner(stage_name, description, expected_output)
+
+    @staticmethod
+    def _charge_usage(attempt_usage: Dict[Future, LeadMetrics], winner: Optional[Future] = None):
+        """
+        Record the usage of every finished attempt against the lead's metrics;
+        an attempt still running is charged the winner's usage (the same
+        prompt, a similar completion), or nothing if no attempt won
+        """
+        for attempt, usage in attempt_usage.items():
+            if not attempt.done():
+                if winner is None:
+                    continue
+                usage = attempt_usage[winner]
+            for record in usage.stages:
+                record_usage(record["stage"], record["model"], record["prompt_tokens"], record["completion_tokens"])
+
+    def __call__(self, stage_name: str, description: str, expected_output: str) -> str:
+        if not self.breaker.allow():
+            raise CircuitOpenError(
+                f"LLM circuit is open, not running {stage_name}", self.breaker.retry_after()
+            )
+
+        started = time.monotonic()
+        budget = float(self.deadlines.get(stage_name, self.default_deadline))
+        deadline = started + budget
+        hedge_at = started + self.hedge_delay(stage_name) if self.hedge_enabled else math.inf
+        primary, usage = self._submit(stage_name, description, expected_output)
+        attempts: List[Future] = [primary]
+        attempt_usage = {primary: usage}
+        # Each attempt's own start, so a winning hedge doesn't report the
+        # primary's head start as latency and inflate the p95
+        attempt_started = {primary: started}
+        pending = set(attempts)
+        last_error: Optional[BaseException] = None
+
+        while True:
+            done, pending = wait(pending, timeout=max(0.0, min(deadline, hedge_at) - time.monotonic()),
+                                 return_when=FIRST_COMPLETED)
+            for attempt in done:
+                error = attempt.exception()
+                if error is None:
+                    self.tracker.record(stage_name, time.monotonic() - attempt_started[attempt])
+                    self.breaker.record(True)
+                    self._charge_usage(attempt_usage, winner=attempt)
+                    if len(attempts) > 1:
+                        counters.inc("zylo_llm_hedges_total", help_text="Hedged LLM calls by winning attempt",
+                                     stage=stage_name, winner="primary" if attempt is attempts[0] else "hedge")
+                    return attempt.result()
+                last_error = error
+                self.breaker.record(False)
+
+            now = time.monotonic()
+            if now >= deadline:
+                self.breaker.record(False)
+                self._charge_usage(attempt_usage)
+                counters.inc("zylo_llm_stage_timeouts_total", help_text="LLM stages that missed their deadline",
+                             stage=stage_name)
+                raise StageTimeoutError(f"{stage_name} did not finish within {budget:g}s")
+
+            # Hedge once: when the first attempt is slower than the stage's p95,
+            # or straight away if it failed outright
+            hedge_due = now >= hedge_at or not pending
+            if hedge_due and len(attempts) == 1 and self.hedge_enabled and self.breaker.allow():
+                logger.info("Hedging %s after %.1fs", stage_name, now - started)
+                hedge, attempt_usage[hedge] = self._submit(stage_name, description, expected_output)
+                attempt_started[hedge] = time.monotonic()
+                attempts.append(hedge)
+                pending.add(hedge)
+            if len(attempts) > 1 or hedge_due:
+                hedge_at = math.inf
+            if not pending:
+                self._charge_usage(attempt_usage)
+                raise last_error
@@ -0,0 +1,300 @@
+import os
+import sys
+import time
+import resource
+import logging
+import threading
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from collections import defaultdict
+from typing import Dict, List, Optional, Any, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.model.lead_generation_metric import LeadGenerationMetric
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Persist per-stage metrics rows for every processed lead
+METRICS_ENABLED = os.getenv("LEAD_METRICS_ENABLED", "true").lower() == "true"
+
+# USD per 1K tokens: (prompt, completion)
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+
+def current_rss_kb() -> Optional[int]:
+    """Resident set size of this process in KB (Linux only)"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_kb() -> int:
+    """Peak resident set size of this process in KB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimate the USD cost of a call from its token usage"""
+    if not model:
+        return 0.0
+    # Match dated variants such as gpt-4-0613 to their base price
+    for name in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(name):
+            prompt_price, completion_price = MODEL_PRICING[name]
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000.0
+    return 0.0
+
+
+class LeadMetrics:
+    """Collects stage timings and token usage for a single lead"""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of work as a named stage"""
+        record = {
+            "stage": name,
+            "status": "ok",
+            "duration_ms": 0.0,
+            "model": None,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost_usd": 0.0,
+        }
+        self.stages.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            record["status"] = "error"
+            raise
+        finally:
+            record["duration_ms"] = (time.perf_counter() - start) * 1000.0
+
+    def record_usage(self, stage: str, model: Optional[str], prompt_tokens: int, completion_tokens: int):
+        """Attach token usage to the most recent record of a stage"""
+        for record in reversed(self.stages):
+            if record["stage"] == stage:
+                break
+        else:
+            record = {"stage": stage, "status": "ok", "duration_ms": 0.0, "model": None,
+                      "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            self.stages.append(record)
+        record["model"] = model
+        record["prompt_tokens"] += prompt_tokens
+        record["completion_tokens"] += completion_tokens
+        record["cost_usd"] += estimate_cost(model, prompt_tokens, completion_tokens)
+
+    def record_outcome(self, stage: str, status: str):
+        """Add an untimed record whose status carries an outcome, e.g. how the final email parsed"""
+        self.stages.append({"stage": stage, "status": status, "duration_ms": 0.0, "model": None,
+                            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+
+    @property
+    def total_cost_usd(self) -> float:
+        return sum(record["cost_usd"] for record in self.stages)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(record["prompt_tokens"] + record["completion_tokens"] for record in self.stages)
+
+    def durations(self) -> Dict[str, float]:
+        """Total milliseconds per stage name"""
+        totals: Dict[str, float] = defaultdict(float)
+        for record in self.stages:
+            totals[record["stage"]] += record["duration_ms"]
+        return dict(totals)
+
+
+# Metrics of the lead currently being processed in this context
+_current_metrics: ContextVar[Optional[LeadMetrics]] = ContextVar("lead_metrics", default=None)
+
+
+@contextmanager
+def lead_metrics_context(metrics: LeadMetrics):
+    """Make `metrics` the target of `track_stage`/`record_usage` for the enclosed block"""
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def track_stage(name: str):
+    """Time a stage against the current lead's metrics, a no-op outside a lead context"""
+    metrics = _current_metrics.get()
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def record_usage(stage: str, model: Optional[str], prompt_tokens: int, completion_tokens: int):
+    """Record token usage against the current lead's metrics, if any"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.record_usage(stage, model, prompt_tokens, completion_tokens)
+
+
+def record_outcome(stage: str, status: str):
+    """Record an outcome against the current lead's metrics, if any"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.record_outcome(stage, status)
+
+
+class CounterRegistry:
+    """Process-local counters (cache hits, parse failures, ...) for the Prometheus dump"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = defaultdict(float)
+        self._help: Dict[str, str] = {}
+
+    def inc(self, name: str, value: float = 1.0, help_text: str = "", **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] += value
+            if help_text:
+                self._help.setdefault(name, help_text)
+
+    def get(self, name: str, **labels: str) -> float:
+        with self._lock:
+            return self._values.get((name, tuple(sorted(labels.items()))), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+            help_texts = dict(self._help)
+        lines = []
+        seen = set()
+        for (name, labels), value in items:
+            if name not in seen:
+                seen.add(name)
+                if name in help_texts:
+                    lines.append(f"# HELP {name} {help_texts[name]}")
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_format_labels(dict(labels))} {value:g}")
+        return lines
+
+
+counters = CounterRegistry()
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsService:
+    """Persists lead metrics and renders aggregates"""
+
+    @staticmethod
+    def persist(db: Session, lead_id: Optional[int], metrics: LeadMetrics, commit: bool = True):
+        """Store one row per recorded stage"""
+        if not METRICS_ENABLED or not metrics.stages:
+            return
+        db.add_all([
+            LeadGenerationMetric(lead_id=lead_id, **record)
+            for record in metrics.stages
+        ])
+        if commit:
+            db.commit()
+
+    @staticmethod
+    def render_prometheus(db: Session) -> str:
+        """
+        Render persisted stage aggregates and process counters in the
+        Prometheus text exposition format
+        """
+        rows = (
+            db.query(
+                LeadGenerationMetric.stage,
+                LeadGenerationMetric.status,
+                func.count(LeadGenerationMetric.id),
+                func.coalesce(func.sum(LeadGenerationMetric.duration_ms), 0.0),
+                func.coalesce(func.sum(LeadGenerationMetric.prompt_tokens), 0),
+                func.coalesce(func.sum(LeadGenerationMetric.completion_tokens), 0),
+                func.coalesce(func.sum(LeadGenerationMetric.cost_usd), 0.0),
+            )
+            .group_by(LeadGenerationMetric.stage, LeadGenerationMetric.status)
+            .order_by(LeadGenerationMetric.stage, LeadGenerationMetric.status)
+            .all()
+        )
+        lead_count, total_cost = db.query(
+            func.count(func.distinct(LeadGenerationMetric.lead_id)),
+            func.coalesce(func.sum(LeadGenerationMetric.cost_usd), 0.0),
+        ).one()
+
+        lines = [
+            "# HELP zylo_stage_duration_seconds Time spent in each pipeline stage",
+            "# TYPE zylo_stage_duration_seconds summary",
+        ]
+        for stage, status, count, duration_ms, _, _, _ in rows:
+            labels = _format_labels({"stage": stage, "status": status})
+            lines.append(f"zylo_stage_duration_seconds_sum{labels} {float(duration_ms) / 1000.0:g}")
+            lines.append(f"zylo_stage_duration_seconds_count{labels} {count}")
+
+        # Token and cost totals are reported per stage regardless of status
+        tokens: Dict[str, List[float]] = defaultdict(lambda: [0, 0, 0.0])
+        for stage, _, _, _, prompt_tokens, completion_tokens, cost in rows:
+            tokens[stage][0] += prompt_tokens
+            tokens[stage][1] += completion_tokens
+            tokens[stage][2] += float(cost)
+
+        lines += [
+            "# HELP zylo_stage_tokens_total LLM tokens consumed per stage",
+            "# TYPE zylo_stage_tokens_total counter",
+        ]
+        for stage, (prompt_tokens, completion_tokens, _) in sorted(tokens.items()):
+            if prompt_tokens or completion_tokens:
+                lines.append(f"zylo_stage_tokens_total{_format_labels({'stage': stage, 'kind': 'prompt'})} {prompt_tokens}")
+                lines.append(f"zylo_stage_tokens_total{_format_labels({'stage': stage, 'kind': 'completion'})} {completion_tokens}")
+
+        lines += [
+            "# HELP zylo_stage_cost_usd_total Estimated LLM cost per stage",
+            "# TYPE zylo_stage_cost_usd_total counter",
+        ]
+        for stage, (_, _, cost) in sorted(tokens.items()):
+            if cost:
+                lines.append(f"zylo_stage_cost_usd_total{_format_labels({'stage': stage})} {cost:g}")
+
+        lines += [
+            "# HELP zylo_leads_measured_total Leads with persisted metrics",
+            "# TYPE zylo_leads_measured_total counter",
+            f"zylo_leads_measured_total {lead_count}",
+            "# HELP zylo_cost_usd_total Estimated LLM cost across all leads",
+            "# TYPE zylo_cost_usd_total counter",
+            f"zylo_cost_usd_total {float(total_cost):g}",
+        ]
+        lines += counters.render()
+        return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    from src.db.session import SessionLocal, engine
+    from src.db.schema import create_schema
+
+    create_schema(engine)
+    db = SessionLocal()
+    try:
+        print(MetricsService.render_prometheus(db), end="")
+    finally:
+        db.close()
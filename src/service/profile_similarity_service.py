@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import random
+import hashlib
+import logging
+import threading
+from array import array
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.db.session import SessionLocal
+from src.model.profile_analysis_record import ProfileAnalysisRecord
+from src.agents.prompt_config import EMAIL_PROMPT_VERSION
+from src.service.metrics_service import counters
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROFILE_REUSE_ENABLED = os.getenv("PROFILE_REUSE_ENABLED", "true").lower() == "true"
+PROFILE_REUSE_SIMILARITY_THRESHOLD = float(os.getenv("PROFILE_REUSE_SIMILARITY_THRESHOLD", "0.9"))
+# Most recent analyses indexed in memory per offer (about 5 KB each); older ones are evicted first
+PROFILE_REUSE_INDEX_MAX_RECORDS = int(os.getenv("PROFILE_REUSE_INDEX_MAX_RECORDS", "5000"))
+# Offers indexed in memory; the least recently used one is dropped beyond this
+PROFILE_REUSE_INDEX_MAX_OFFERS = int(os.getenv("PROFILE_REUSE_INDEX_MAX_OFFERS", "4"))
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 128
+# 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+_URL_PREFIX_RE = re.compile(r"^(https?://)?(www\.|[a-z]{2}\.)?")
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Word k-shingles of normalized text"""
+    words = _WORD_RE.findall((text or "").lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures over string shingles using universal hashing"""
+
+    def __init__(self, num_perm: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: Set[str]) -> List[int]:
+        if not items:
+            return [_MERSENNE_PRIME] * self.num_perm
+        hashes = [
+            int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "big")
+            for item in items
+        ]
+        return [
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._params
+        ]
+
+    @staticmethod
+    def similarity(left: List[int], right: List[int]) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        if not left or len(left) != len(right):
+            return 0.0
+        return sum(1 for a, b in zip(left, right) if a == b) / len(left)
+
+
+def person_key(url: Optional[str], name: Optional[str]) -> Optional[str]:
+    """
+    Identity an analysis may be reused for: the normalized profile URL, else
+    the normalized name. None if neither is known (nothing is reused).
+    """
+    if url and url.strip():
+        normalized = _URL_PREFIX_RE.sub("", url.strip().lower()).split("?", 1)[0].split("#", 1)[0]
+        return "url:" + normalized.rstrip("/")
+    words = _WORD_RE.findall((name or "").lower())
+    return "name:" + " ".join(words) if words else None
+
+
+class _OfferIndex:
+    """LSH buckets over one offer's analyses, oldest-first eviction beyond `max_records`"""
+
+    def __init__(self, max_records: int):
+        self.max_records = max_records
+        # record id -> (signature, person key); analysis texts stay in the database
+        self.records: "OrderedDict[int, Tuple[array, str]]" = OrderedDict()
+        # bucket hash (band and its rows) -> record ids
+        self.buckets: Dict[int, List[int]] = defaultdict(list)
+
+    def add(self, record_id: int, signature: List[int], person: str):
+        if record_id in self.records:
+            return
+        self.records[record_id] = (array("Q", signature), person)
+        for band_key in _band_keys(signature):
+            self.buckets[band_key].append(record_id)
+        while len(self.records) > self.max_records:
+            self.remove(next(iter(self.records)))
+
+    def remove(self, record_id: int):
+        entry = self.records.pop(record_id, None)
+        if entry is None:
+            return
+        for band_key in _band_keys(entry[0]):
+            bucket = self.buckets.get(band_key)
+            if bucket and record_id in bucket:
+                bucket.remove(record_id)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def best_match(self, signature: List[int], person: str, threshold: float) -> Optional[Tuple[int, float]]:
+        candidates = set()
+        for band_key in _band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+        best: Optional[Tuple[int, float]] = None
+        for record_id in candidates:
+            other, other_person = self.records[record_id]
+            if other_person != person:
+                continue
+            score = MinHasher.similarity(signature, other)
+            if score >= threshold and (best is None or score > best[1]):
+                best = (record_id, score)
+        return best
+
+
+def _band_keys(signature) -> List[int]:
+    # Plain ints rather than (band, hash) tuples: the buckets dominate the index's memory
+    return [
+        hash((band, *signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]))
+        for band in range(LSH_BANDS)
+    ]
+
+
+class ProfileSimilarityService:
+    """
+    Local MinHash/LSH index over rendered profiles, used to reuse a prior
+    `profile_analysis_task` output for near-duplicate profiles of the same
+    person with the same offer
+
+    Memory is bounded: at most `max_offers` offers and `max_records`
+    signatures per offer are held, and analysis texts are read from the
+    database on a hit.
+    """
+
+    def __init__(self,
+                 session_factory=SessionLocal,
+                 threshold: float = PROFILE_REUSE_SIMILARITY_THRESHOLD,
+                 enabled: bool = PROFILE_REUSE_ENABLED,
+                 prompt_version: str = EMAIL_PROMPT_VERSION,
+                 max_records: int = PROFILE_REUSE_INDEX_MAX_RECORDS,
+                 max_offers: int = PROFILE_REUSE_INDEX_MAX_OFFERS):
+        self.session_factory = session_factory
+        self.threshold = threshold
+        self.enabled = enabled
+        self.prompt_version = prompt_version
+        self.max_records = max_records
+        self.max_offers = max_offers
+        self.hasher = MinHasher()
+        self._lock = threading.Lock()
+        # offer_key -> index, least recently used first
+        self._offers: "OrderedDict[str, _OfferIndex]" = OrderedDict()
+        self.lookups = 0
+        self.reused = 0
+
+    @property
+    def reuse_rate(self) -> float:
+        return self.reused / self.lookups if self.lookups else 0.0
+
+    def offer_key(self, offer: str) -> str:
+        return hashlib.sha256(f"{self.prompt_version}\x00{offer}".encode("utf-8")).hexdigest()
+
+    def signature(self, profile_text: str) -> Optional[List[int]]:
+        """MinHash signature of a rendered profile, None when reuse is disabled"""
+        if not self.enabled:
+            return None
+        return self.hasher.signature(shingles(profile_text))
+
+    def find_analysis(self,
+                      signature: Optional[List[int]],
+                      offer: str,
+                      person: Optional[str]) -> Optional[Tuple[str, float]]:
+        """
+        Return (analysis, similarity) of the most similar analyzed profile of
+        the same person for the same offer, if it clears the threshold
+
+        Args:
+            signature: From `signature()`
+            offer: Offer the analysis is for
+            person: From `person_key()`; nothing is reused without one
+        """
+        if not self.enabled or signature is None or not person:
+            return None
+        try:
+            offer_key = self.offer_key(offer)
+            with self._lock:
+                match = self._load_offer(offer_key).best_match(signature, person, self.threshold)
+
+            best: Optional[Tuple[str, float]] = None
+            if match:
+                db = self.session_factory()
+                try:
+                    analysis = db.query(ProfileAnalysisRecord.analysis).filter(
+                        ProfileAnalysisRecord.id == match[0]
+                    ).scalar()
+                finally:
+                    db.close()
+                if analysis:
+                    best = (analysis, match[1])
+                else:
+                    with self._lock:
+                        if offer_key in self._offers:
+                            self._offers[offer_key].remove(match[0])
+
+            with self._lock:
+                self.lookups += 1
+                if best:
+                    self.reused += 1
+            counters.inc("zylo_profile_analysis_lookups_total",
+                         help_text="Near-duplicate profile analysis lookups",
+                         outcome="reused" if best else "computed")
+            return best
+        except Exception as e:
+            # Reuse is an optimization, fall back to running the analysis
+            logger.error("Profile similarity lookup failed: %s", e)
+            return None
+
+    def add_analysis(self,
+                     profile_text: str,
+                     signature: Optional[List[int]],
+                     offer: str,
+                     person: Optional[str],
+                     analysis: str):
+        """Persist an analysis and add it to the in-memory index"""
+        if not self.enabled or signature is None or not person or not analysis:
+            return
+        offer_key = self.offer_key(offer)
+        db = self.session_factory()
+        try:
+            record = ProfileAnalysisRecord(
+                offer_key=offer_key,
+                person_key=person,
+                profile_hash=hashlib.sha256((profile_text or "").encode("utf-8")).hexdigest(),
+                signature=json.dumps(signature),
+                analysis=analysis
+            )
+            db.add(record)
+            db.commit()
+            with self._lock:
+                if offer_key in self._offers:
+                    self._offers[offer_key].add(record.id, signature, person)
+        except Exception as e:
+            logger.error("Failed to store profile analysis: %s", e)
+            db.rollback()
+        finally:
+            db.close()
+
+    def _load_offer(self, offer_key: str) -> _OfferIndex:
+        """Index for an offer, loading its stored signatures on first use (caller holds the lock)"""
+        index = self._offers.get(offer_key)
+        if index is not None:
+            self._offers.move_to_end(offer_key)
+            return index
+
+        db = self.session_factory()
+        try:
+            rows = (
+                db.query(ProfileAnalysisRecord.id, ProfileAnalysisRecord.signature, ProfileAnalysisRecord.person_key)
+                .filter(
+                    ProfileAnalysisRecord.offer_key == offer_key,
+                    ProfileAnalysisRecord.person_key.isnot(None)
+                )
+                .order_by(ProfileAnalysisRecord.id.desc())
+                .limit(self.max_records)
+                .all()
+            )
+        finally:
+            db.close()
+
+        # Only registered once the load succeeded, so a failed query is retried on the next lookup
+        index = _OfferIndex(self.max_records)
+        for record_id, signature, person in reversed(rows):
+            index.add(record_id, json.loads(signature), person)
+        self._offers[offer_key] = index
+        while len(self._offers) > self.max_offers:
+            self._offers.popitem(last=False)
+        logger.info("Loaded %s profile analyses into the similarity index", len(rows))
+        return index
@@ -0,0 +1,39 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# `src` modules read configuration at import time; point them at local stand-ins
+os.environ.setdefault("OPENAI_API_KEY", "sk-test-not-used")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """Sessions on a fresh SQLite database with the full schema; a file, so each thread gets its own connection"""
+    from src.db.schema import create_schema
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    create_schema(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def add_leads():
+    """Insert `count` leads that have settled long ago into `db`; returns their ids"""
+    from src.model.lead_email_details import LeadEmailDetails
+
+    def add(db, count, **fields):
+        settled = datetime.utcnow() - timedelta(hours=1)
+        leads = [
+            LeadEmailDetails(lead_name=f"Lead {i}", snapshot_id="s1", updated_at=settled, **fields)
+            for i in range(count)
+        ]
+        db.add_all(leads)
+        db.commit()
+        return [lead.id for lead in leads]
+
+    return add
@@ -0,0 +1,56 @@
+from src.benchmark.fakes import FakeLLM, FakeS3Client, LatencyDistribution, make_profile
+from src.service.email_cache_service import EmailCacheService
+from src.service.email_generation_service import EmailGenerationService
+from src.service.linkedin_client_service import LinkedInClientService
+from src.service.metrics_service import MetricsService
+from src.service.profile_similarity_service import ProfileSimilarityService
+
+
+def make_service(session_factory, monkeypatch, stage_runner, malformed_rate=0.0):
+    """A service on fake S3 and LLM with one profile in snapshot "s1"; returns it and the generation inputs"""
+    for name in ("S3_BUCKET", "AWS_ACCESS_KEY", "AWS_SECRET_KEY"):
+        monkeypatch.setenv(name, "test")
+    s3 = FakeS3Client(LatencyDistribution())
+    url = s3.add_snapshot("s1", [make_profile(0)])[0]
+    llm = FakeLLM(LatencyDistribution(), malformed_rate=malformed_rate)
+
+    service = EmailGenerationService(
+        linkedin_service=LinkedInClientService(s3_client=s3),
+        stage_runner=lambda *args: stage_runner(llm, *args),
+        result_cache=EmailCacheService(session_factory=session_factory, enabled=True),
+        profile_index=ProfileSimilarityService(enabled=False),
+    )
+    inputs = {"snapshot_id": "s1", "lead_name": "Jane Smith", "linkedin_url": url,
+              "offer": "Training", "cta": "Reply", "seller_name": "John"}
+    return service, inputs
+
+
+def test_refresh_skips_the_cached_email_and_replaces_it(session_factory, monkeypatch):
+    stages = []
+
+    def counting_runner(llm, stage_name, description, expected_output):
+        stages.append(stage_name)
+        return llm(stage_name, description, expected_output)
+
+    service, inputs = make_service(session_factory, monkeypatch, counting_runner)
+
+    service.generate_email(**inputs)
+    calls = len(stages)
+    assert service.generate_email(**inputs).get("cached")
+    assert len(stages) == calls
+
+    forced = service.generate_email(**inputs, refresh=True)
+    assert forced["status"] == "success" and not forced.get("cached")
+    assert len(stages) > calls
+
+
+def test_parse_outcome_is_persisted_with_the_lead_metrics(session_factory, monkeypatch):
+    service, inputs = make_service(session_factory, monkeypatch, lambda llm, *args: llm(*args), malformed_rate=1.0)
+
+    result = service.generate_email(**inputs)
+    db = session_factory()
+    MetricsService.persist(db, 1, result["metrics"])
+
+    # The malformed output only parses after the repair pass
+    rendered = MetricsService.render_prometheus(db)
+    assert 'zylo_stage_duration_seconds_count{stage="email_parse",status="repaired"} 1' in rendered
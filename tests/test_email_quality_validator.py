@@ -0,0 +1,29 @@
+from src.service.email_quality_validator import EmailQualityGate, validate_email
+
+CTA = "Reply to this email or schedule a 15-minute call to learn how we can tailor our training."
+BODY = (
+    "Hi Jane,\n"
+    "Your team's move to weekly releases caught my eye.\n"
+    "Reply to this email or schedule a 15-minute call to see how we'd tailor training to your team.\n"
+    "Best,\nJohn Doe"
+)
+
+
+def test_clean_email_passes():
+    assert validate_email("Weekly releases", BODY, CTA, "John Doe") == []
+
+
+def test_spam_words_match_whole_words_only():
+    body = BODY.replace("caught my eye", "gives you the freedom to experiment")
+    assert validate_email("Urgently needed", body, CTA, "John Doe") == []
+
+    issues = validate_email("Act now", BODY.replace("caught my eye", "is urgent"), CTA, "John Doe")
+    assert issues == ["spam trigger words: act now, urgent"]
+
+
+def test_gate_skips_llm_review_for_passing_email():
+    gate = EmailQualityGate(audit_sample_rate=0.0)
+
+    assert not gate.needs_llm_review("Weekly releases", BODY, CTA, "John Doe")
+    assert gate.needs_llm_review("Weekly releases", BODY.replace("John Doe", "[Your Name]"), CTA, "John Doe")
+    assert gate.skip_rate == 0.5
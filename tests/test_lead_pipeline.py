@@ -0,0 +1,104 @@
+import time
+from types import SimpleNamespace
+
+from src.model.lead_email_details import LeadEmailDetails
+from src.service.lead_pipeline import LeadPipeline
+from src.service.lead_scheduler import LeadScheduler
+
+
+class FakeEmailService:
+    """Stands in for EmailGenerationService: every profile exists, generation takes `delay` seconds"""
+
+    def __init__(self, delay=0.0, on_generate=None):
+        self.delay = delay
+        self.on_generate = on_generate
+        self.linkedin_service = SimpleNamespace(get_linkedin_profile=lambda snapshot_id, url: object())
+
+    def generate_email(self, lead_name, metrics=None, **kwargs):
+        if self.on_generate:
+            self.on_generate(lead_name)
+        time.sleep(self.delay)
+        return {"status": "success", "subject": f"Hi {lead_name}", "body": "Body", "metrics": metrics}
+
+
+def run_pipeline(session_factory, email_service, **kwargs):
+    pipeline = LeadPipeline(email_service, settle_delay_seconds=0, scheduler=LeadScheduler(batch_size=2),
+                            session_factory=session_factory, **kwargs)
+    return pipeline.run()
+
+
+def test_generates_every_settled_lead(session_factory, add_leads):
+    db = session_factory()
+    lead_ids = add_leads(db, 5)
+
+    assert run_pipeline(session_factory, FakeEmailService()) == 5
+
+    db.expire_all()
+    assert {db.get(LeadEmailDetails, lead_id).status for lead_id in lead_ids} == {"done"}
+
+
+def test_heartbeat_renews_claims_during_generation(session_factory, add_leads):
+    db = session_factory()
+    add_leads(db, 1)
+    claimed_at = []
+
+    def read_claim(lead_name):
+        check = session_factory()
+        try:
+            claimed_at.append(check.query(LeadEmailDetails.claimed_at).scalar())
+        finally:
+            check.close()
+
+    def generate_then_check(lead_name):
+        read_claim(lead_name)
+        time.sleep(0.3)
+        read_claim(lead_name)
+
+    run_pipeline(session_factory, FakeEmailService(on_generate=generate_then_check), heartbeat_seconds=0.05)
+
+    assert claimed_at[1] > claimed_at[0]
+
+
+def test_unpreparable_lead_fails_alone(session_factory, add_leads):
+    db = session_factory()
+    lead_ids = add_leads(db, 4)
+    email_service = FakeEmailService()
+
+    def get_profile(snapshot_id, url):
+        if url == "corrupt":
+            raise ValueError("corrupt row")
+        return object()
+
+    email_service.linkedin_service = SimpleNamespace(get_linkedin_profile=get_profile)
+    db.get(LeadEmailDetails, lead_ids[0]).linkedin_url = "corrupt"
+    db.commit()
+
+    assert run_pipeline(session_factory, email_service) == 3
+
+    db.expire_all()
+    poisoned = db.get(LeadEmailDetails, lead_ids[0])
+    assert poisoned.status == "error"
+    assert "corrupt row" in poisoned.error_message
+    assert {db.get(LeadEmailDetails, lead_id).status for lead_id in lead_ids[1:]} == {"done"}
+
+
+def test_failed_write_back_marks_lead_error(session_factory, add_leads, monkeypatch):
+    from src.service import lead_pipeline
+
+    db = session_factory()
+    lead_ids = add_leads(db, 2)
+    save = lead_pipeline.save_generation_result
+
+    def flaky_save(session, lead, result):
+        if lead.id == lead_ids[1]:
+            raise RuntimeError("connection reset")
+        return save(session, lead, result)
+
+    monkeypatch.setattr(lead_pipeline, "save_generation_result", flaky_save)
+    run_pipeline(session_factory, FakeEmailService())
+
+    db.expire_all()
+    assert db.get(LeadEmailDetails, lead_ids[0]).status == "done"
+    failed = db.get(LeadEmailDetails, lead_ids[1])
+    assert failed.status == "error"
+    assert "connection reset" in failed.error_message
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# A long run is the point: per-lead growth too small to see over a few hundred leads
+# adds up over thousands. Marked slow, so only `pytest -m slow` runs it; override the
+# lead count for a quicker local check.
+LEADS = int(os.getenv("MEMORY_TEST_LEADS", "10000"))
+SAMPLE_EVERY = max(LEADS // 20, 1)
+MAX_RSS_GROWTH_KB = int(os.getenv("MEMORY_TEST_MAX_RSS_GROWTH_KB", "8192"))
+
+
+@pytest.mark.slow
+def test_rss_stays_flat_over_a_long_synthetic_run(tmp_path):
+    """The job pipeline, with production defaults, holds resident memory flat after warm-up"""
+    output = tmp_path / "results.jsonl"
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    subprocess.run(
+        [
+            sys.executable, "-m", "src.benchmark.run",
+            "--leads", str(LEADS),
+            "--rss-sample-every", str(SAMPLE_EVERY),
+            "--log-file", str(tmp_path / "app.log"),
+            "--output", str(output),
+        ],
+        cwd=REPO_ROOT, env=env, check=True, capture_output=True, timeout=1800,
+    )
+
+    result = json.loads(output.read_text().splitlines()[-1])
+    assert result["config"]["profile_reuse"] is True
+    assert result["status_counts"] == {"done": LEADS}
+    assert result["rss_growth_kb"] < MAX_RSS_GROWTH_KB, result["rss_series_kb"]
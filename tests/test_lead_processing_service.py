@@ -0,0 +1,56 @@
+from src.model.lead_email_details import LeadEmailDetails
+from src.model.lead_email_variant import LeadEmailVariant
+from src.service.lead_processing_service import requeue_leads, save_generation_result
+from src.service.metrics_service import MetricsService
+
+
+def test_failed_regeneration_clears_previous_variants(session_factory):
+    db = session_factory()
+    lead = LeadEmailDetails(lead_name="Jane Smith", snapshot_id="s1", status="in_progress")
+    db.add(lead)
+    db.commit()
+    variants = [{"subject": "A", "body": "Body A"}, {"subject": "B", "body": "Body B"}]
+
+    save_generation_result(db, lead, {"status": "success", "subject": "A", "body": "Body A", "variants": variants})
+    assert db.query(LeadEmailVariant).filter_by(lead_id=lead.id).count() == 2
+
+    save_generation_result(db, lead, {"status": "error", "message": "LLM refused"})
+
+    assert lead.status == "error"
+    assert db.query(LeadEmailVariant).filter_by(lead_id=lead.id).count() == 0
+
+
+def test_metrics_failure_does_not_change_a_stored_result(session_factory, monkeypatch):
+    db = session_factory()
+    lead = LeadEmailDetails(lead_name="Jane Smith", snapshot_id="s1", status="in_progress")
+    db.add(lead)
+    db.commit()
+
+    def fail_persist(*args, **kwargs):
+        raise RuntimeError("metrics table locked")
+
+    monkeypatch.setattr(MetricsService, "persist", staticmethod(fail_persist))
+    variants = [{"subject": "A", "body": "Body A"}]
+    result = save_generation_result(db, lead, {"status": "success", "subject": "A", "body": "Body A", "variants": variants})
+
+    assert result["status"] == "success"
+    db.expire_all()
+    assert lead.status == "done"
+    assert lead.generated_email_body == "Body A"
+    assert db.query(LeadEmailVariant).filter_by(lead_id=lead.id).count() == 1
+
+
+def test_success_and_requeue_clear_the_last_error(session_factory):
+    db = session_factory()
+    lead = LeadEmailDetails(lead_name="Jane Smith", snapshot_id="s1", status="in_progress")
+    db.add(lead)
+    db.commit()
+
+    save_generation_result(db, lead, {"status": "error", "message": "LLM refused"})
+    requeue_leads(db, "s1", {})
+    db.refresh(lead)
+    assert (lead.status, lead.error_message) == ("not_started", None)
+
+    save_generation_result(db, lead, {"status": "error", "message": "LLM refused"})
+    save_generation_result(db, lead, {"status": "success", "subject": "A", "body": "Body A"})
+    assert (lead.status, lead.error_message) == ("done", None)
@@ -0,0 +1,69 @@
+import time
+from datetime import datetime, timedelta
+
+from src.model.lead_email_details import LeadEmailDetails
+from src.service.lead_processing_service import claim_lead, release_leads
+from src.service.lead_scheduler import LeadScheduler, claim_heartbeat, renew_claims
+
+def test_claim_starts_a_lease(session_factory, add_leads):
+    db = session_factory()
+    add_leads(db, 3)
+
+    claimed = LeadScheduler(batch_size=2).claim_batch(db, datetime.utcnow())
+
+    assert len(claimed) == 2
+    for lead_id in claimed:
+        lead = db.get(LeadEmailDetails, lead_id)
+        assert lead.status == "in_progress"
+        assert lead.claimed_at is not None
+
+
+def test_expired_claims_are_reclaimed_first(session_factory, add_leads):
+    db = session_factory()
+    waiting = add_leads(db, 2)
+    abandoned = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow() - timedelta(hours=1))
+    legacy = add_leads(db, 1, status="in_progress")
+    live = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow())
+
+    claimed = LeadScheduler(batch_size=10, lease_seconds=60).claim_batch(db, datetime.utcnow())
+
+    assert claimed[:2] == abandoned + legacy
+    assert sorted(claimed[2:]) == waiting
+    assert live[0] not in claimed
+
+
+def test_renewed_claims_are_not_reclaimed(session_factory, add_leads):
+    db = session_factory()
+    held = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow() - timedelta(hours=1))
+
+    assert renew_claims(db, held) == 1
+    assert LeadScheduler(lease_seconds=60).claim_batch(db, datetime.utcnow()) == []
+
+
+def test_claim_heartbeat_keeps_a_long_generation_claimed(session_factory, add_leads):
+    db = session_factory()
+    held = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow() - timedelta(hours=1))
+
+    with claim_heartbeat(session_factory, held, interval_seconds=0.05):
+        time.sleep(0.3)
+        assert LeadScheduler(lease_seconds=60).claim_batch(db, datetime.utcnow()) == []
+
+
+def test_claim_lead_takes_over_expired_claim_only(session_factory, add_leads):
+    db = session_factory()
+    expired = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow() - timedelta(days=1))
+    live = add_leads(db, 1, status="in_progress", claimed_at=datetime.utcnow())
+
+    assert claim_lead(db, expired[0])
+    assert not claim_lead(db, live[0])
+
+
+def test_release_clears_the_lease(session_factory, add_leads):
+    db = session_factory()
+    add_leads(db, 1)
+    claimed = LeadScheduler().claim_batch(db, datetime.utcnow())
+
+    assert release_leads(db, claimed) == 1
+    lead = db.get(LeadEmailDetails, claimed[0])
+    db.refresh(lead)
+    assert (lead.status, lead.claimed_at) == ("not_started", None)
@@ -0,0 +1,66 @@
+import pytest
+
+from src.agents.prompt_registry import prompt_registry
+
+CAMPAIGN = {
+    "offer": "Managed Postgres backups",
+    "cta": "Book a 15 minute call",
+    "seller_name": "John Doe",
+    "variant_count": 2,
+}
+
+LEADS = [
+    {
+        "lead_name": "Jane Smith",
+        "linkedin_profile": "Jane Smith, VP Engineering at Acme",
+        "company_profile": "Acme builds logistics software",
+        "profile_analysis_result": "Scaling a platform team",
+        "company_analysis_result": "Growing fast in EU logistics",
+    },
+    {
+        "lead_name": "Bob Lee",
+        "linkedin_profile": "Bob Lee, CTO at Initech",
+        "company_profile": "Initech sells TPS reporting tools",
+        "profile_analysis_result": "Cutting infrastructure costs",
+        "company_analysis_result": "Mature market, cost focused",
+    },
+]
+
+CAMPAIGN_STAGES = [
+    "profile_analysis_task",
+    "company_analysis_task",
+    "email_creation_task",
+    "email_variants_task",
+]
+
+
+@pytest.mark.parametrize("stage", CAMPAIGN_STAGES)
+def test_consecutive_leads_share_byte_identical_prefix(stage):
+    prompt = prompt_registry[stage]
+    first, second = (prompt.render({**CAMPAIGN, **lead}) for lead in LEADS)
+    prefix = prompt.prefix(CAMPAIGN)
+
+    assert first.encode("utf-8").startswith(prefix.encode("utf-8"))
+    assert second.encode("utf-8").startswith(prefix.encode("utf-8"))
+    assert first != second
+
+
+@pytest.mark.parametrize("field, value", [
+    ("offer", "Hosted Redis"),
+    ("cta", "Reply with a good time"),
+    ("seller_name", "Mary Major"),
+])
+def test_campaign_input_changes_prefix(field, value):
+    prompt = prompt_registry["email_creation_task"]
+    changed = {**CAMPAIGN, field: value}
+
+    assert prompt.prefix(changed) != prompt.prefix(CAMPAIGN)
+    assert prompt.render({**changed, **LEADS[0]}).startswith(prompt.prefix(changed))
+
+
+def test_lead_fields_stay_out_of_prefix():
+    prompt = prompt_registry["email_creation_task"]
+    prefix = prompt.prefix({**CAMPAIGN, **LEADS[0]})
+
+    assert prefix == prompt.prefix(CAMPAIGN)
+    assert LEADS[0]["lead_name"] not in prefix